@@ -0,0 +1,115 @@
+"""Measures clipping server requests/sec with N simulated local clients
+
+Starts clip_server.py in a subprocess unless --url is given:
+    python -m benchmarks.clip_server_load --clients 1 4 16 --mesh Brain
+"""
+import argparse
+import http.client
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+
+def post(connection, path, body):
+    connection.request('POST', path, json.dumps(body),
+                       {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    data = response.read()
+    if response.status != 200:
+        raise RuntimeError(f"{path}: {response.status} {data[:200]}")
+    return data
+
+def random_bounds(bounds, rng):
+    clip = []
+    for axis in range(3):
+        low, high = bounds[axis*2], bounds[axis*2+1]
+        a, b = sorted(rng.uniform(low, high) for _ in range(2))
+        clip += [a, b]
+    return clip
+
+def client(host, port, mesh, bounds, endpoint, duration, seed, latencies, errors):
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection(host, port)
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        try:
+            post(connection, endpoint, {'name': mesh,
+                                        'bounds': random_bounds(bounds, rng)})
+        except (RuntimeError, OSError):
+            errors.append(1)
+            connection.close()
+            connection = http.client.HTTPConnection(host, port)
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+def run(host, port, mesh, bounds, endpoint, n_clients, duration):
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client,
+                                args=(host, port, mesh, bounds, endpoint,
+                                      duration, seed, latencies, errors))
+               for seed in range(n_clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+def wait_for_server(host, port, timeout=60):
+    end = time.perf_counter() + timeout
+    while time.perf_counter() < end:
+        try:
+            connection = http.client.HTTPConnection(host, port)
+            connection.request('GET', '/meshes')
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('Server did not start')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', help='Running server, e.g. http://127.0.0.1:8765')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--mesh', default='Tube')
+    parser.add_argument('--endpoint', default='/clip', choices=('/clip', '/render'))
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url = urlparse(args.url)
+        host, port = url.hostname, url.port
+    else:
+        host, port = '127.0.0.1', args.port
+        server = subprocess.Popen([sys.executable, 'clip_server.py',
+                                   '--port', str(port)])
+    try:
+        wait_for_server(host, port)
+        connection = http.client.HTTPConnection(host, port)
+        bounds = json.loads(post(connection, '/load', {'name': args.mesh}))['bounds']
+        connection.close()
+
+        for n_clients in args.clients:
+            latencies, errors, elapsed = run(host, port, args.mesh, bounds,
+                                             args.endpoint, n_clients,
+                                             args.duration)
+            latency = np.array(latencies) * 1000 if latencies else np.zeros(1)
+            p50, p99 = np.percentile(latency, [50, 99])
+            print(f"{n_clients:>3} clients: {len(latencies) / elapsed:8.1f} req/s | "
+                  f"p50 {p50:7.1f} ms | p99 {p99:7.1f} ms | {len(errors)} errors")
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,58 @@
+"""Compares uniform and adaptive sampling of the Laurent lattice isosurface
+
+Run from the repository root:
+    python -m benchmarks.laurent_lattice --resolutions 200 400 800 --uniform-max 400
+"""
+import argparse
+import gc
+import time
+
+import numpy as np
+
+from library import helpers
+from library.memory_monitor import current_rss, peak_rss, reset_peak_rss
+
+
+class CountingField:
+    """Wraps the Laurent field to count its evaluations"""
+    def __init__(self, field):
+        self.field = field
+        self.evaluations = 0
+
+    def __call__(self, ρ, θ, ϕ):
+        self.evaluations += np.size(ρ)
+        return self.field(ρ, θ, ϕ)
+
+def run(resolution, adaptive):
+    original = helpers.laurent_field
+    field = CountingField(original)
+    helpers.laurent_field = field
+    gc.collect()
+    rss_before = current_rss()
+    reset_peak_rss()
+    start = time.perf_counter()
+    try:
+        mesh = helpers.load_Laurent_lattice(resolution, adaptive=adaptive)
+    finally:
+        helpers.laurent_field = original
+    seconds = time.perf_counter() - start
+    peak = (peak_rss() - rss_before) / 1e6
+    return mesh, seconds, field.evaluations, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[200, 400, 800])
+    parser.add_argument('--uniform-max', type=int, default=400,
+                        help='Largest resolution to also sample uniformly')
+    args = parser.parse_args()
+
+    for resolution in args.resolutions:
+        print(f"Resolution {resolution}^3")
+        methods = [True] + ([False] if resolution <= args.uniform_max else [])
+        for adaptive in methods:
+            mesh, seconds, evaluations, peak = run(resolution, adaptive)
+            label = 'adaptive' if adaptive else 'uniform'
+            print(f"  {label:8s} {seconds:7.2f} s | {evaluations:12,d} evaluations "
+                  f"({evaluations / resolution ** 3:6.1%}) | peak +{peak:8.1f} MB | "
+                  f"{mesh.n_cells:10,d} triangles | area {mesh.area:10.2f}")
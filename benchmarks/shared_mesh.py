@@ -0,0 +1,67 @@
+"""Compares sending a mesh to worker processes by pickling with shared memory
+
+    python -m benchmarks.shared_mesh --mesh "Tube Network" --workers 8
+"""
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+from library import mesh_sources
+from library.shared_mesh import SharedMeshStore
+
+
+worker = {}
+
+def private_memory():
+    """Returns the private (unshared) memory of this process in MB"""
+    total = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                total += int(line.split()[1])
+    return total / 1024
+
+def init_pickled(mesh):
+    worker['mesh'] = mesh
+
+def init_shared(store, name):
+    worker['mesh'] = store.attach(name)
+
+def touch(_):
+    # Read every point so the data is actually mapped in
+    mesh = worker['mesh']
+    float(np.asarray(mesh.points).sum())
+    return private_memory()
+
+context = multiprocessing.get_context('spawn')
+
+def run(workers, initializer, initargs):
+    start = time.perf_counter()
+    with context.Pool(workers, initializer, initargs) as pool:
+        memory = pool.map(touch, range(workers), chunksize=1)
+    return time.perf_counter() - start, memory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mesh', default='Tube Network')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    mesh = mesh_sources.builtin_registry().load(args.mesh)
+    print(f"{args.mesh}: {mesh.n_points} points, "
+          f"{mesh.actual_memory_size / 1024:.1f} MB, {args.workers} workers")
+
+    seconds, memory = run(args.workers, init_pickled, (mesh,))
+    print(f"  pickled: start {seconds:6.2f} s | private memory per worker "
+          f"{np.mean(memory):8.1f} MB")
+
+    with SharedMeshStore(context=context) as store:
+        start = time.perf_counter()
+        store.publish(args.mesh, mesh)
+        publish = time.perf_counter() - start
+        seconds, memory = run(args.workers, init_shared, (store, args.mesh))
+    print(f"   shared: start {seconds:6.2f} s (+{publish:.2f} s publish) | "
+          f"private memory per worker {np.mean(memory):8.1f} MB")
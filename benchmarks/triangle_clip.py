@@ -0,0 +1,80 @@
+"""Compares VTK box clipping with the NumPy triangle clipping backend
+
+    python -m benchmarks.triangle_clip --repeats 20
+
+Each random box is clipped with clip_box on the original mesh, with clip_box
+on the triangulated surface, and with clip_triangles. The differences in
+clipped area and bounds are reported for the demo meshes, the pass/fail
+checks are in tests/test_triangle_clip.py.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from library import mesh_sources
+from library.triangle_clip import clip_triangles, triangle_surface
+
+
+MESHES = ['Tube', 'Grid', 'Mount St. Helens', 'Laurent Lattice', 'Tube Network']
+
+def random_boxes(bounds, count, seed=0):
+    rng = np.random.default_rng(seed)
+    lower = np.array(bounds[::2])
+    upper = np.array(bounds[1::2])
+    ends = lower + rng.uniform(0, 1, (count, 2, 3)) * (upper - lower)
+    ends.sort(axis=1)
+    return ends.transpose(0, 2, 1).reshape(count, 6)
+
+def timed(clip, boxes):
+    times, results = [], []
+    for box in boxes:
+        start = time.perf_counter()
+        results.append(clip(list(box)))
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000, results
+
+def check(expected, results):
+    """Returns the largest relative area difference and bounds mismatch"""
+    area_error, bounds_error = 0.0, 0.0
+    for vtk_clip, numpy_clip in zip(expected, results):
+        vtk_surface = vtk_clip.extract_surface()
+        if vtk_surface.n_cells == 0 or numpy_clip.n_cells == 0:
+            if vtk_surface.n_cells != numpy_clip.n_cells:
+                area_error = np.inf
+            continue
+        area = vtk_surface.area
+        area_error = max(area_error, abs(numpy_clip.area - area) / area)
+        scale = np.ptp(np.reshape(vtk_surface.bounds, (3, 2)), axis=1).max()
+        bounds_error = max(bounds_error, np.abs(np.subtract(numpy_clip.bounds,
+                                                            vtk_surface.bounds)).max()
+                           / scale)
+    return area_error, bounds_error
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--meshes', nargs='+', default=MESHES)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    registry = mesh_sources.builtin_registry()
+    for name in args.meshes:
+        mesh = registry.load(name)
+        surface = triangle_surface(mesh)
+        if surface is None:
+            print(f"{name}: skipped, not a triangle surface")
+            continue
+        boxes = random_boxes(mesh.bounds, args.repeats)
+
+        vtk_time, _ = timed(lambda b: mesh.clip_box(b, invert=False), boxes)
+        tri_time, expected = timed(lambda b: surface.clip_box(b, invert=False), boxes)
+        numpy_time, results = timed(lambda b: clip_triangles(surface, b), boxes)
+        area_error, bounds_error = check(expected, results)
+
+        print(f"{name}: {surface.n_cells} triangles")
+        print(f"  clip_box         {vtk_time:8.2f} ms")
+        print(f"  clip_box (tris)  {tri_time:8.2f} ms")
+        print(f"  clip_triangles   {numpy_time:8.2f} ms | "
+              f"{tri_time / numpy_time:5.1f}x | max area error {area_error:.2e} | "
+              f"max bounds error {bounds_error:.2e}")
@@ -0,0 +1,84 @@
+"""Compares batched tube network generation against one spline tube per segment
+
+Run from the repository root:
+    python -m benchmarks.tube_network --segments 100000
+
+tube() caps the ends of each tube by default while tube_network leaves
+them open, so the per-tube meshes are built with capping=False to compare
+the same cells.
+"""
+import argparse
+import gc
+import os
+import time
+
+import numpy as np
+import pyvista as pv
+
+from library import helpers
+
+
+def current_rss():
+    """Returns the resident set size of this process in MB"""
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1e6
+
+def per_tube(centerlines, radii, n_sides=12):
+    tubes = []
+    for line, r in zip(centerlines, radii):
+        spline = pv.Spline(line, n_points=len(line))
+        spline['radius'] = r
+        tubes.append(spline.tube(radius=np.min(r), scalars='radius',
+                                 radius_factor=np.max(r) / np.min(r),
+                                 n_sides=n_sides, capping=False))
+    return tubes
+
+def batched(centerlines, radii, n_sides=12):
+    return [helpers.tube_network(centerlines, radii, n_sides=n_sides)]
+
+def run(method, centerlines, radii, render):
+    gc.collect()
+    rss_before = current_rss()
+    start = time.perf_counter()
+    meshes = method(centerlines, radii)
+    generation = time.perf_counter() - start
+
+    actor_time = 0
+    if render:
+        plotter = pv.Plotter(off_screen=True)
+        start = time.perf_counter()
+        for mesh in meshes:
+            plotter.add_mesh(mesh, show_scalar_bar=False)
+        plotter.render()
+        actor_time = time.perf_counter() - start
+        plotter.close()
+
+    memory = current_rss() - rss_before
+    n_cells = sum(mesh.n_cells for mesh in meshes)
+    del meshes
+    return generation, actor_time, memory, n_cells
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--segments', type=int, default=10000)
+    parser.add_argument('--points', type=int, default=10,
+                        help='Centerline points per segment')
+    parser.add_argument('--render', action='store_true',
+                        help='Also time adding the actors to an off-screen plotter')
+    parser.add_argument('--skip-per-tube', action='store_true')
+    args = parser.parse_args()
+
+    centerlines, radii = helpers.random_network(args.segments, args.points)
+    methods = [('batched', batched)]
+    if not args.skip_per_tube:
+        methods.insert(0, ('per-tube', per_tube))
+
+    print(f"{args.segments} segments, {args.points} points each")
+    for name, method in methods:
+        generation, actor_time, memory, n_cells = run(method, centerlines,
+                                                      radii, args.render)
+        print(f"{name:>9}: generation {generation:8.3f} s | "
+              f"actors {actor_time:8.3f} s | RSS +{memory:8.1f} MB | "
+              f"{n_cells} cells")
@@ -1,5 +1,7 @@
 
 import sys
+import argparse
+import logging
 from PyQt5.QtWidgets import (QApplication, QMainWindow,
                              QWidget, QCheckBox, QPushButton, QSlider, QLabel, 
                              QVBoxLayout, QHBoxLayout, QFormLayout)
@@ -12,10 +14,12 @@ from library.ui import qt_objects as QtO
 from library.ui.options_panel import OptionsPanel
 from library import helpers
 from library.plot_actors import PlotActor
+from library.interaction_log import InteractionRecorder
+from library.memory_monitor import MemoryMonitor
                              
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, record_path=None, memory_budget=None):
         super().__init__()
         self.setWindowTitle("Clipping Demo")
         
@@ -26,7 +30,9 @@ class MainWindow(QMainWindow):
         
         # Create plotter
         self.plotter = QtInteractor(self)
-        self.plotActor = PlotActor(self.plotter)
+        self.plotActor = PlotActor(self.plotter, MemoryMonitor(memory_budget))
+        if record_path:
+            self.plotActor.recorder = InteractionRecorder(record_path)
         
         # Create options panel
         self.optionsPanel = OptionsPanel(self.plotter, self.plotActor)
@@ -36,10 +42,25 @@ class MainWindow(QMainWindow):
         self.pageLayout.addWidget(self.optionsPanel, alignment=Qt.AlignCenter)
         
         return
+    
+    def closeEvent(self, event):
+        if self.plotActor.recorder:
+            self.plotActor.recorder.close()
+        for line in self.plotActor.monitor.report():
+            logging.info(line)
+        super().closeEvent(event)
 
         
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    mainWindow = MainWindow()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--record', metavar='PATH',
+                        help='Record UI interactions to a session file')
+    parser.add_argument('--memory-budget', type=float, metavar='MB',
+                        help='Process memory budget enforced on loads and clips')
+    args, qt_args = parser.parse_known_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    
+    app = QApplication(sys.argv[:1] + qt_args)
+    mainWindow = MainWindow(args.record, args.memory_budget)
     mainWindow.show()
     sys.exit(app.exec_())
\ No newline at end of file
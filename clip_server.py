@@ -0,0 +1,34 @@
+"""Serves clipping of shared meshes to several local clients over HTTP
+
+    python clip_server.py --port 8765 --preload Brain
+
+See library/clip_server.py for the API.
+"""
+import argparse
+
+from library.clip_server import ClipServer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--preload', nargs='*', default=[],
+                        help='Mesh names to load before serving')
+    parser.add_argument('--file', nargs='*', default=[],
+                        help='Mesh files to register')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server = ClipServer((args.host, args.port), verbose=args.verbose)
+    for path in args.file:
+        server.store.registry.register_file(path)
+    for name in args.preload:
+        server.store.get(name)
+
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
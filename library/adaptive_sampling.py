@@ -0,0 +1,219 @@
+import numpy as np
+import pyvista as pv
+import vtk
+from scipy.ndimage import binary_dilation
+from vtk.util.numpy_support import numpy_to_vtk
+
+from library.readers import CHUNK_SIZE, cell_array
+
+
+# Number of blocks sampled at once
+BATCH_BLOCKS = 2048
+
+# Corner offsets of a hexahedron in VTK point order
+HEX_CORNERS = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+                        [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]])
+
+
+def evaluate(field, lower, spacing, indices):
+    """Evaluates a field at (N, 3) lattice indices in chunks
+
+    The field is called with three coordinate arrays, like a function
+    evaluated on np.mgrid, but on at most CHUNK_SIZE points at a time so the
+    temporaries of the field stay small.
+
+    """
+    values = np.empty(indices.shape[0])
+    for start in range(0, indices.shape[0], CHUNK_SIZE):
+        coords = lower + indices[start:start+CHUNK_SIZE] * spacing
+        values[start:start+CHUNK_SIZE] = field(*coords.T)
+    return values
+
+def block_lattice(blocks, size, samples, n):
+    """Returns the lattice indices sampled in each block
+
+    Parameters
+    ----------
+    blocks: (B, 3) int array
+        Block indices
+
+    size: int
+        Block edge length in lattice cells
+
+    samples: int
+        Number of samples per block edge, including both ends
+
+    n: int
+        Number of lattice points per axis. Samples past the end are clamped.
+
+    Returns
+    -------
+    (B, samples, samples, samples, 3) int array
+
+    """
+    steps = np.linspace(0, size, samples).round().astype(np.int64)
+    grid = np.stack(np.meshgrid(steps, steps, steps, indexing='ij'), axis=-1)
+    lattice = blocks[:, None, None, None, :] * size + grid[None]
+    return np.minimum(lattice, n - 1)
+
+def sample_blocks(field, lower, spacing, lattice, n):
+    """Evaluates each unique lattice point of some blocks once
+
+    Returns
+    -------
+    ids: int array
+        Shape of the lattice without its last axis, indexes keys and values
+
+    keys: (P,) int array
+        Sorted flat lattice index of each evaluated point
+
+    values: (P,) array
+
+    """
+    flat = lattice.reshape(-1, 3)
+    keys = flat[:, 0] + n * (flat[:, 1] + n * flat[:, 2])
+    keys, first, ids = np.unique(keys, return_index=True, return_inverse=True)
+    values = evaluate(field, lower, spacing, flat[first])
+    return ids.reshape(lattice.shape[:-1]), keys, values
+
+def refine_blocks(field, lower, spacing, n, isovalue, block_size, coarse_blocks):
+    """Finds the leaf blocks that may contain the isosurface
+
+    Starts with blocks of block_size * 2^k cells, so that at most
+    coarse_blocks fit along each axis, and halves the block size each
+    level. A block stays active if its 3x3x3 samples, widened by the
+    largest step between neighbouring samples, include the isovalue. Active
+    blocks are dilated by one block so that thin features between samples
+    of neighbouring blocks are not lost.
+
+    Returns
+    -------
+    blocks: (B, 3) int array
+        Active leaf blocks
+
+    evaluations: int
+        Number of field evaluations used for the refinement
+
+    """
+    cells = n - 1
+    sizes = [block_size]
+    while -(-cells // sizes[-1]) > coarse_blocks:
+        sizes.append(sizes[-1] * 2)
+
+    blocks, evaluations = None, 0
+    for size in reversed(sizes):
+        dims = -(-cells // size)
+        if blocks is None:
+            blocks = np.argwhere(np.ones((dims,) * 3, dtype=bool))
+        else:
+            blocks = (blocks[:, None, :] * 2 + HEX_CORNERS[None]).reshape(-1, 3)
+            blocks = blocks[(blocks < dims).all(axis=1)]
+
+        mask = np.zeros((dims,) * 3, dtype=bool)
+        for start in range(0, blocks.shape[0], BATCH_BLOCKS):
+            batch = blocks[start:start+BATCH_BLOCKS]
+            ids, _, values = sample_blocks(field, lower, spacing,
+                                           block_lattice(batch, size, 3, n), n)
+            evaluations += values.shape[0]
+            samples = values[ids]
+            steps = np.maximum.reduce([np.abs(np.diff(samples, axis=axis)).max(axis=(1, 2, 3))
+                                       for axis in (1, 2, 3)])
+            low = samples.min(axis=(1, 2, 3)) - steps
+            high = samples.max(axis=(1, 2, 3)) + steps
+            active = batch[(low <= isovalue) & (high >= isovalue)]
+            mask[tuple(active.T)] = True
+        blocks = np.argwhere(binary_dilation(mask, np.ones((3, 3, 3))))
+    return blocks, evaluations
+
+def crossing_cells(ids, values, block_size, isovalue):
+    """Returns the (H, 8) hexahedra of sampled blocks whose corners include the isovalue
+
+    Cells clamped flat past the far edges of the lattice are dropped.
+    """
+    b = block_size
+    hexes = np.stack([ids[:, i:i + b, j:j + b, k:k + b] for i, j, k in HEX_CORNERS],
+                     axis=-1).reshape(-1, 8)
+    flat = ((hexes[:, 0] == hexes[:, 1]) | (hexes[:, 0] == hexes[:, 3])
+            | (hexes[:, 0] == hexes[:, 4]))
+    corner_values = values[hexes]
+    crossing = ((corner_values.min(axis=1) <= isovalue)
+                & (corner_values.max(axis=1) >= isovalue))
+    return hexes[crossing & ~flat]
+
+def sparse_sample(field, lower, upper, resolution, isovalue=0.0, block_size=8,
+                  coarse_blocks=16):
+    """Samples a field only in the cells crossed by an isosurface
+
+    Equivalent to evaluating the field on a uniform grid of resolution
+    points per axis and keeping the cells whose corner values include the
+    isovalue, but only the blocks found by refine_blocks are evaluated at
+    full resolution, a batch of blocks at a time. Contouring the result
+    gives the same isosurface as contouring the full grid wherever the
+    refinement found the surface.
+
+    Parameters
+    ----------
+    field: function
+        Called with three coordinate arrays, returns the field values
+
+    lower: list or tuple
+        Lower corner of the sampled domain
+
+    upper: list or tuple
+        Upper corner of the sampled domain
+
+    resolution: int
+        Effective number of lattice points per axis
+
+    isovalue: float, optional
+
+    block_size: int, optional
+        Edge length of the leaf blocks in lattice cells. Must be even.
+
+    coarse_blocks: int, optional
+        Maximum number of blocks per axis at the coarsest level
+
+    Returns
+    -------
+    grid: pv.UnstructuredGrid
+        Hexahedra crossed by the isosurface with 'values' point data
+
+    evaluations: int
+        Total number of field evaluations
+
+    """
+    n = resolution
+    lower = np.asarray(lower, dtype=np.float64)
+    spacing = (np.asarray(upper, dtype=np.float64) - lower) / (n - 1)
+
+    blocks, evaluations = refine_blocks(field, lower, spacing, n, isovalue,
+                                        block_size, coarse_blocks)
+
+    # Evaluate the active leaf blocks at full resolution and keep the
+    # crossing cells by their flat lattice keys, merged across batches below
+    hex_keys, point_keys, point_values = [], [], []
+    for start in range(0, blocks.shape[0], BATCH_BLOCKS):
+        lattice = block_lattice(blocks[start:start+BATCH_BLOCKS], block_size,
+                                block_size + 1, n)
+        ids, keys, values = sample_blocks(field, lower, spacing, lattice, n)
+        evaluations += values.shape[0]
+        hexes = crossing_cells(ids, values, block_size, isovalue)
+        used = np.unique(hexes)
+        hex_keys.append(keys[hexes])
+        point_keys.append(keys[used])
+        point_values.append(values[used])
+
+    keys, connectivity = np.unique(np.concatenate(hex_keys), return_inverse=True)
+    point_keys, first = np.unique(np.concatenate(point_keys), return_index=True)
+    values = np.concatenate(point_values)[first]
+    indices = np.stack([keys % n, keys // n % n, keys // (n * n)], axis=1)
+    connectivity = connectivity.ravel()
+
+    grid = pv.UnstructuredGrid()
+    grid.points = lower + indices * spacing
+    offsets = np.arange(0, connectivity.shape[0] + 1, 8, dtype=np.int64)
+    types = np.full(offsets.shape[0] - 1, vtk.VTK_HEXAHEDRON, dtype=np.uint8)
+    grid.SetCells(numpy_to_vtk(types, deep=False, array_type=vtk.VTK_UNSIGNED_CHAR),
+                  cell_array(offsets, connectivity))
+    grid.point_data['values'] = values
+    return grid, evaluations
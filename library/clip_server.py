@@ -0,0 +1,245 @@
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pyvista as pv
+import vtk
+from vtk.util.numpy_support import vtk_to_numpy
+
+from library import exporters, mesh_sources
+from library.plot_actors import PlotActor
+
+
+class BadRequest(Exception):
+    """Malformed request body, answered with 400"""
+
+
+class UnknownMesh(KeyError):
+    """Mesh name missing from the registry, answered with 404"""
+
+
+class MeshStore:
+    """Loads each mesh source once and shares it between all clients
+
+    Parameters
+    ----------
+    registry: MeshRegistry, optional
+        Defaults to the built-in meshes
+
+    """
+    def __init__(self, registry=None):
+        self.registry = registry or mesh_sources.builtin_registry()
+        self.actors = {}
+        self.lock = threading.Lock()
+        self.load_locks = {}
+
+    def get(self, name):
+        """Returns the PlotActor holding a mesh, loading it on first use
+
+        Concurrent first requests for the same mesh wait for one load
+        instead of loading it several times.
+        """
+        if name in self.actors:
+            return self.actors[name]
+        if name not in self.registry:
+            raise UnknownMesh(f"Unknown mesh '{name}'")
+
+        with self.lock:
+            load_lock = self.load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            if name not in self.actors:
+                plotActor = PlotActor(None)
+                plotActor.load_original(self.registry.load(name))
+                self.actors[name] = plotActor
+        return self.actors[name]
+
+    def clip(self, name, bounds):
+        """Clips a shared mesh to bounds
+
+        The clip runs on a shallow copy, so concurrent clips of the same
+        mesh do not share a VTK pipeline input.
+        """
+        original = self.get(name).original
+        return original.copy(deep=False).clip_box(bounds, invert=False)
+
+    def describe(self):
+        return [{'name': source.name, 'kind': source.kind,
+                 'estimated_size': source.estimated_size,
+                 'loaded': source.name in self.actors}
+                for source in self.registry]
+
+
+class Renderer:
+    """Renders clip results to PNG with one shared off-screen plotter
+
+    VTK render windows are not thread safe, so renders are serialized.
+    """
+    def __init__(self, window_size=(800, 600)):
+        self.lock = threading.Lock()
+        self.plotter = pv.Plotter(off_screen=True, window_size=list(window_size))
+        self.plotActor = PlotActor(self.plotter)
+
+    def render(self, plotActor, mesh, window_size=None, camera=None):
+        with self.lock:
+            if window_size:
+                self.plotter.window_size = list(window_size)
+            self.plotActor.has_normals = plotActor.has_normals
+            self.plotActor.show(mesh, reset_camera=camera is None)
+            if camera:
+                self.plotter.camera_position = camera
+            self.plotter.render()
+
+            window_image = vtk.vtkWindowToImageFilter()
+            window_image.SetInput(self.plotter.ren_win)
+            window_image.ReadFrontBufferOff()
+            writer = vtk.vtkPNGWriter()
+            writer.WriteToMemoryOn()
+            writer.SetInputConnection(window_image.GetOutputPort())
+            writer.Write()
+            return vtk_to_numpy(writer.GetResult()).tobytes()
+
+
+# Fields each POST route needs in its request body
+REQUIRED_FIELDS = {'/load': ('name',), '/clip': ('name', 'bounds'),
+                   '/render': ('name', 'bounds')}
+
+
+class ClipRequestHandler(BaseHTTPRequestHandler):
+    """HTTP API of the clipping server
+
+    GET  /meshes  JSON list of mesh sources
+    POST /load    {"name"} -> JSON bounds and sizes of the loaded mesh
+    POST /clip    {"name", "bounds", "format": "npz" | "vtk",
+                   "compress": false} -> binary clip result
+    POST /render  {"name", "bounds", "window_size", "camera"} -> PNG
+    """
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes, without TCP_NODELAY the
+    # body waits for the client's delayed ACK of the headers
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == '/meshes':
+            self.send_json(self.server.store.describe())
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        routes = {'/load': self.load, '/clip': self.clip, '/render': self.render}
+        if self.path not in routes:
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = self.parse(self.rfile.read(length))
+            routes[self.path](request)
+        except BadRequest as error:
+            self.send_error(400, str(error))
+        except UnknownMesh as error:
+            self.send_error(404, str(error))
+        except Exception as error:
+            self.log_error('Failed %s: %r', self.path, error)
+            self.send_error(500, str(error))
+
+    def parse(self, body):
+        """Decodes and checks a request body, raising BadRequest if malformed"""
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError as error:
+            raise BadRequest(f'Invalid JSON: {error}')
+        if not isinstance(request, dict):
+            raise BadRequest('Request body must be a JSON object')
+        for field in REQUIRED_FIELDS[self.path]:
+            if field not in request:
+                raise BadRequest(f"Missing request field '{field}'")
+        if not isinstance(request['name'], str):
+            raise BadRequest("'name' must be a string")
+        bounds = request.get('bounds', [0] * 6)
+        if (not isinstance(bounds, list) or len(bounds) != 6
+                or not all(isinstance(value, (int, float)) for value in bounds)):
+            raise BadRequest("'bounds' must be a list of 6 numbers")
+        if request.get('format', 'npz') not in ('npz', 'vtk'):
+            raise BadRequest("'format' must be 'npz' or 'vtk'")
+        window_size = request.get('window_size') or [1, 1]
+        if (not isinstance(window_size, list) or len(window_size) != 2
+                or not all(isinstance(value, int) and value > 0 for value in window_size)):
+            raise BadRequest("'window_size' must be a list of 2 positive integers")
+        camera = request.get('camera') or [[0, 0, 0]] * 3
+        if (not isinstance(camera, list) or len(camera) != 3
+                or not all(isinstance(vector, list) and len(vector) == 3
+                           and all(isinstance(value, (int, float)) for value in vector)
+                           for vector in camera)):
+            raise BadRequest("'camera' must be 3 lists of 3 numbers")
+        return request
+
+    def load(self, request):
+        mesh = self.server.store.get(request['name']).original
+        self.send_json({'name': request['name'], 'bounds': list(mesh.bounds),
+                        'n_points': mesh.n_points, 'n_cells': mesh.n_cells})
+
+    def clip(self, request):
+        clipped = self.server.store.clip(request['name'], request['bounds'])
+        output = io.BytesIO()
+        buffers = exporters.mesh_buffers(clipped)
+        if request.get('format', 'npz') == 'npz':
+            exporters.write_npz(output, buffers, request.get('compress', False))
+            content_type = 'application/x-npz'
+        else:
+            exporters.write_vtk_xml(output, buffers, request.get('compress', False))
+            content_type = 'application/xml'
+        self.send_body(output.getvalue(), content_type)
+
+    def render(self, request):
+        store = self.server.store
+        clipped = store.clip(request['name'], request['bounds'])
+        image = self.server.renderer.render(store.get(request['name']), clipped,
+                                            request.get('window_size'),
+                                            request.get('camera'))
+        self.send_body(image, 'image/png')
+
+    def send_json(self, data):
+        self.send_body(json.dumps(data).encode(), 'application/json')
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ClipServer(ThreadingHTTPServer):
+    """Threaded HTTP server sharing one MeshStore between all clients
+
+    Parameters
+    ----------
+    address: tuple
+        (host, port)
+
+    store: MeshStore, optional
+
+    verbose: bool, optional
+        Log every request
+
+    """
+    daemon_threads = True
+
+    def __init__(self, address, store=None, verbose=False):
+        super().__init__(address, ClipRequestHandler)
+        self.store = store or MeshStore()
+        self.verbose = verbose
+        self._renderer = None
+        self._renderer_lock = threading.Lock()
+
+    @property
+    def renderer(self):
+        # The off-screen plotter is only created once an image is requested
+        with self._renderer_lock:
+            if self._renderer is None:
+                self._renderer = Renderer()
+        return self._renderer
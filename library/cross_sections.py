@@ -0,0 +1,162 @@
+import numpy as np
+import pyvista as pv
+from vtk.util.numpy_support import vtk_to_numpy
+
+
+AXES = ('x', 'y', 'z')
+
+
+def cell_offsets(mesh):
+    """Returns (offsets, connectivity) of every cell of a PolyData or UnstructuredGrid
+
+    PolyData cells are numbered verts, lines, polys, then strips, so the
+    sections are concatenated in that order.
+    """
+    if isinstance(mesh, pv.UnstructuredGrid):
+        cells = [mesh.GetCells()]
+    else:
+        cells = [mesh.GetVerts(), mesh.GetLines(), mesh.GetPolys(), mesh.GetStrips()]
+
+    offsets, connectivity = [np.zeros(1, dtype=np.int64)], []
+    shift = 0
+    for cell_array in cells:
+        section_offsets = vtk_to_numpy(cell_array.GetOffsetsArray())
+        offsets.append(section_offsets[1:] + shift)
+        connectivity.append(vtk_to_numpy(cell_array.GetConnectivityArray()))
+        shift += connectivity[-1].shape[0]
+    return np.concatenate(offsets), np.concatenate(connectivity)
+
+def structured_extents(mesh, axis):
+    """Returns the per-cell (min, max) of a StructuredGrid along an axis"""
+    nx, ny, nz = mesh.dimensions
+    coords = np.asarray(mesh.points)[:, axis].reshape(nz, ny, nx)
+    corners = [coords[k:k + max(nz - 1, 1), j:j + max(ny - 1, 1), i:i + max(nx - 1, 1)]
+               for k in (0, int(nz > 1)) for j in (0, int(ny > 1))
+               for i in (0, int(nx > 1))]
+    return (np.minimum.reduce(corners).ravel(), np.maximum.reduce(corners).ravel())
+
+def round_float32(values, direction):
+    """Casts values to float32, rounding towards -inf or +inf
+
+    A plain cast rounds to nearest, which can move a cell extent past a
+    slice position on meshes with float64 points far from the origin.
+    """
+    rounded = values.astype(np.float32)
+    if values.dtype != np.float32:
+        inexact = rounded < values if direction > 0 else rounded > values
+        rounded[inexact] = np.nextafter(rounded[inexact], np.float32(direction * np.inf))
+    return rounded
+
+
+class CrossSections:
+    """Orthogonal cross-sections from cell extents sorted once per axis
+
+    Cells are sorted by their minimum along each axis. A slice position
+    then only needs two binary searches to find the few cells that can
+    cross it, and only those cells are cut. UniformGrid volumes are
+    sliced directly from their point arrays instead.
+
+    Parameters
+    ----------
+    mesh: pv.DataSet
+
+    """
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.sorted_axes = []
+        if isinstance(mesh, pv.UniformGrid):
+            return
+
+        if not isinstance(mesh, (pv.PolyData, pv.UnstructuredGrid, pv.StructuredGrid)):
+            mesh = self.mesh = mesh.cast_to_unstructured_grid()
+        if not isinstance(mesh, pv.StructuredGrid):
+            offsets, connectivity = cell_offsets(mesh)
+            starts = offsets[:-1]
+
+        index_type = np.int32 if mesh.n_cells < 2**31 else np.int64
+        for axis in range(3):
+            if isinstance(mesh, pv.StructuredGrid):
+                cell_min, cell_max = structured_extents(mesh, axis)
+            else:
+                coords = np.asarray(mesh.points)[:, axis][connectivity]
+                cell_min = np.minimum.reduceat(coords, starts)
+                cell_max = np.maximum.reduceat(coords, starts)
+            order = np.argsort(cell_min, kind='stable').astype(index_type)
+            # Stored in float32 rounded outwards, so the extents only grow
+            # and no crossing cell is missed
+            sorted_min = round_float32(cell_min[order], -1)
+            cell_max = round_float32(cell_max, 1)
+            self.sorted_axes.append({
+                'order': order,
+                'sorted_min': sorted_min,
+                'cell_max': cell_max,
+                'max_length': (float((cell_max[order].astype(np.float64) - sorted_min).max())
+                               if cell_min.size else 0)})
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for axis in self.sorted_axes
+                   for array in axis.values() if isinstance(array, np.ndarray))
+
+    def crossing_cells(self, axis, position):
+        """Returns the ids of the cells that cross a plane"""
+        data = self.sorted_axes[axis]
+        # Cells starting more than the longest cell before the plane cannot reach it
+        start = np.searchsorted(data['sorted_min'], position - data['max_length'], 'left')
+        stop = np.searchsorted(data['sorted_min'], position, 'right')
+        ids = data['order'][start:stop]
+        return ids[data['cell_max'][ids] >= position]
+
+    def slice(self, axis, position):
+        """Returns the cross-section of the mesh at a position along an axis
+
+        Parameters
+        ----------
+        axis: int
+            0, 1, 2 for the X, Y, Z axes
+
+        position: float
+
+        Returns
+        -------
+        pv.DataSet or None
+            None if no cell crosses the plane
+
+        """
+        if isinstance(self.mesh, pv.UniformGrid):
+            return self.grid_slice(axis, position)
+
+        ids = self.crossing_cells(axis, position)
+        if not ids.size:
+            return None
+        origin = list(self.mesh.center)
+        origin[axis] = position
+        section = self.mesh.extract_cells(ids).slice(normal=AXES[axis], origin=origin)
+        return section if section.n_points else None
+
+    def grid_slice(self, axis, position):
+        """Returns the plane of grid points nearest to a position as a 2D UniformGrid"""
+        grid = self.mesh
+        dims = list(grid.dimensions)
+        index = int(round((position - grid.origin[axis]) / grid.spacing[axis]))
+        if not 0 <= index < dims[axis]:
+            return None
+
+        origin = list(grid.origin)
+        origin[axis] += index * grid.spacing[axis]
+        slice_dims = list(dims)
+        slice_dims[axis] = 1
+        section = pv.UniformGrid(dims=slice_dims, spacing=grid.spacing, origin=origin)
+
+        # Point arrays are x-fastest, i.e. C-ordered as [z, y, x]
+        take = [slice(None)] * 3
+        take[2 - axis] = index
+        for name in grid.point_data.keys():
+            array = np.asarray(grid.point_data[name])
+            shaped = array.reshape(dims[::-1] + list(array.shape[1:]))
+            section.point_data[name] = shaped[tuple(take)].reshape(-1, *array.shape[1:])
+
+        scalars = grid.GetPointData().GetScalars()
+        if scalars is not None and scalars.GetName():
+            section.GetPointData().SetActiveScalars(scalars.GetName())
+        return section
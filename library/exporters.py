@@ -0,0 +1,327 @@
+import os
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+import pyvista as pv
+from vtk.util.numpy_support import vtk_to_numpy
+
+from library.readers import VTK_XML_TYPES
+
+
+# Bytes written per progress update and per compressed block
+BLOCK_SIZE = 2 ** 22
+
+XML_TYPES = {np.dtype('<' + code): name for name, code in VTK_XML_TYPES.items()}
+
+CELL_SECTIONS = {'Verts': 'GetVerts', 'Lines': 'GetLines',
+                 'Strips': 'GetStrips', 'Polys': 'GetPolys'}
+
+# A single writer thread keeps exports in the order they were requested
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+
+
+def cell_buffers(cells):
+    """Returns (offsets, connectivity) views of a vtkCellArray"""
+    return (vtk_to_numpy(cells.GetOffsetsArray()),
+            vtk_to_numpy(cells.GetConnectivityArray()))
+
+def mesh_buffers(mesh):
+    """Collects views of a mesh's arrays without copying them
+
+    Meshes other than PolyData and UnstructuredGrid are converted to an
+    UnstructuredGrid first, which does copy them.
+
+    Parameters
+    ----------
+    mesh: pv.DataSet
+
+    Returns
+    -------
+    dict
+        'type', 'points', 'cells' ({section: (offsets, connectivity)}),
+        'celltypes', 'point_data' and 'cell_data' entries
+
+    """
+    if not isinstance(mesh, (pv.PolyData, pv.UnstructuredGrid)):
+        mesh = mesh.cast_to_unstructured_grid()
+
+    buffers = {'mesh': mesh, 'points': mesh.points, 'celltypes': None,
+               'point_data': {}, 'cell_data': {}}
+    if isinstance(mesh, pv.PolyData):
+        buffers['type'] = 'PolyData'
+        buffers['cells'] = {section: cell_buffers(getattr(mesh, getter)())
+                            for section, getter in CELL_SECTIONS.items()}
+    else:
+        buffers['type'] = 'UnstructuredGrid'
+        buffers['cells'] = {'Cells': cell_buffers(mesh.GetCells())}
+        buffers['celltypes'] = mesh.celltypes
+
+    for key, data in (('point_data', mesh.point_data),
+                      ('cell_data', mesh.cell_data)):
+        for name in data.keys():
+            array = np.asarray(data[name])
+            if array.dtype in XML_TYPES:
+                buffers[key][name] = array
+    return buffers
+
+def open_output(target):
+    """Opens a path for binary writing, or passes an open file through"""
+    if hasattr(target, 'write'):
+        return nullcontext(target)
+    return open(target, 'wb')
+
+def array_bytes(array):
+    """Returns a flat byte view of an array, also for empty arrays"""
+    return np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+
+def write_chunks(f, array, progress):
+    data = array_bytes(array)
+    for start in range(0, len(data), BLOCK_SIZE):
+        f.write(data[start:start+BLOCK_SIZE])
+        progress(min(BLOCK_SIZE, len(data) - start))
+
+
+## NPZ
+def npz_arrays(buffers):
+    arrays = {'points': buffers['points']}
+    for section, (offsets, connectivity) in buffers['cells'].items():
+        if connectivity.size:
+            arrays[f'{section.lower()}_offsets'] = offsets
+            arrays[f'{section.lower()}_connectivity'] = connectivity
+    if buffers['celltypes'] is not None:
+        arrays['celltypes'] = buffers['celltypes']
+    for key in ('point_data', 'cell_data'):
+        for name, array in buffers[key].items():
+            arrays[f'{key}/{name}'] = array
+    return arrays
+
+def write_npz(path, buffers, compress=False, progress=None):
+    """Writes mesh buffers as an NPZ archive of .npy arrays
+
+    path may also be a binary file object, e.g. io.BytesIO.
+    """
+    progress = progress or (lambda n_bytes: None)
+    arrays = npz_arrays(buffers)
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(path, 'w', compression=compression) as archive:
+        for name, array in arrays.items():
+            with archive.open(name + '.npy', 'w', force_zip64=True) as f:
+                header = np.lib.format.header_data_from_array_1_0(array)
+                np.lib.format.write_array_header_2_0(f, header)
+                write_chunks(f, array, progress)
+
+
+## VTK XML
+def xml_array(array, offset, name=None):
+    components = int(np.prod(array.shape[1:]))
+    name = f' Name="{name}"' if name else ''
+    return (f'<DataArray type="{XML_TYPES[array.dtype]}"{name} '
+            f'NumberOfComponents="{components}" format="appended" '
+            f'offset="{offset}"/>')
+
+def compress_blocks(array):
+    """Compresses an array into the block layout of vtkZLibDataCompressor"""
+    data = array_bytes(array)
+    blocks = [zlib.compress(data[start:start+BLOCK_SIZE])
+              for start in range(0, len(data), BLOCK_SIZE)]
+    last = len(data) % BLOCK_SIZE or (BLOCK_SIZE if blocks else 0)
+    header = np.array([len(blocks), BLOCK_SIZE, last]
+                      + [len(block) for block in blocks], dtype='<u8')
+    return header, blocks
+
+def xml_entries(buffers):
+    """Returns the (XML section, name, array) entries of mesh buffers"""
+    entries = []
+    for key, section in (('point_data', 'PointData'), ('cell_data', 'CellData')):
+        for name, array in buffers[key].items():
+            entries.append((section, name, array))
+    entries.append(('Points', None, buffers['points']))
+    for section, (offsets, connectivity) in buffers['cells'].items():
+        entries.append((section, 'connectivity', connectivity))
+        # VTK XML stores the end offset of each cell, without the leading 0
+        entries.append((section, 'offsets', offsets[1:]))
+    if buffers['celltypes'] is not None:
+        entries.append(('Cells', 'types', buffers['celltypes']))
+    return entries
+
+def write_vtk_xml(path, buffers, compress=False, progress=None):
+    """Writes mesh buffers as a VTK XML file with raw appended data
+
+    Parameters
+    ----------
+    path: str or file
+        Should end in .vtp for PolyData and .vtu for UnstructuredGrid. A
+        binary file object, e.g. io.BytesIO, is written to directly.
+
+    buffers: dict
+        Output of mesh_buffers
+
+    compress: bool, optional
+        zlib-compress the arrays as vtkZLibDataCompressor does
+
+    progress: function, optional
+        Called with the number of uncompressed bytes written
+
+    """
+    progress = progress or (lambda n_bytes: None)
+    mesh_type = buffers['type']
+    n_points = buffers['points'].shape[0]
+    entries = xml_entries(buffers)
+    counts = {section: array.shape[0] for section, name, array in entries
+              if name == 'offsets'}
+
+    # Raw data of each array is preceded by its UInt64 byte count or
+    # compression header. Compressed blocks are held in memory until the
+    # header, which lists their offsets, has been written.
+    payloads = []
+    offset = 0
+    sections = {}
+    for section, name, array in entries:
+        if compress:
+            header, blocks = compress_blocks(array)
+            size = header.nbytes + sum(len(block) for block in blocks)
+            payloads.append((header, blocks, array))
+        else:
+            header = np.array([array.nbytes], dtype='<u8')
+            size = header.nbytes + array.nbytes
+            payloads.append((header, None, array))
+        sections.setdefault(section, []).append(xml_array(array, offset, name))
+        offset += size
+
+    if mesh_type == 'PolyData':
+        piece = f'NumberOfPoints="{n_points}" ' + ' '.join(
+            f'NumberOf{section}="{counts[section]}"' for section in CELL_SECTIONS)
+    else:
+        piece = f'NumberOfPoints="{n_points}" NumberOfCells="{counts["Cells"]}"'
+    compressor = ' compressor="vtkZLibDataCompressor"' if compress else ''
+
+    lines = ['<?xml version="1.0"?>',
+             f'<VTKFile type="{mesh_type}" version="1.0" '
+             f'byte_order="LittleEndian" header_type="UInt64"{compressor}>',
+             f'  <{mesh_type}>', f'    <Piece {piece}>']
+    for section in ['PointData', 'CellData', 'Points', 'Cells'] + list(CELL_SECTIONS):
+        if section in sections:
+            lines.append(f'      <{section}>')
+            lines.extend('        ' + array for array in sections[section])
+            lines.append(f'      </{section}>')
+    lines += ['    </Piece>', f'  </{mesh_type}>',
+              '  <AppendedData encoding="raw">', '   _']
+
+    with open_output(path) as f:
+        f.write('\n'.join(lines).encode('ascii'))
+        for header, blocks, array in payloads:
+            f.write(header.tobytes())
+            if blocks is None:
+                write_chunks(f, array, progress)
+                continue
+            for block in blocks:
+                f.write(block)
+            progress(array.nbytes)
+        f.write(b'\n  </AppendedData>\n</VTKFile>\n')
+
+
+def export_path(path, buffers):
+    """Returns the path with the extension matching the mesh and format"""
+    root, extension = os.path.splitext(path)
+    if extension.lower() == '.npz':
+        return path
+    return root + ('.vtp' if buffers['type'] == 'PolyData' else '.vtu')
+
+def export_meshes(paths, meshes, compress=False, progress=None):
+    """Writes meshes to binary files and measures the write throughput
+
+    Files ending in .npz are written as NPZ archives, anything else as
+    VTK XML with raw appended data.
+
+    Parameters
+    ----------
+    paths: list of str
+
+    meshes: list of pv.DataSet
+
+    compress: bool, optional
+
+    progress: function, optional
+        Called with (bytes written, total bytes) as blocks are written
+
+    Returns
+    -------
+    dict
+        Written 'paths', 'bytes' of array data, 'seconds', and 'mb_per_s'
+
+    """
+    all_buffers = [mesh_buffers(mesh) for mesh in meshes]
+    return write_buffers(paths, all_buffers, compress, progress)
+
+def written_arrays(path, buffers):
+    if path.lower().endswith('.npz'):
+        return list(npz_arrays(buffers).values())
+    return [array for _, _, array in xml_entries(buffers)]
+
+def write_buffers(paths, all_buffers, compress=False, progress=None):
+    paths = [export_path(path, buffers)
+             for path, buffers in zip(paths, all_buffers)]
+    total = sum(array.nbytes for path, buffers in zip(paths, all_buffers)
+                for array in written_arrays(path, buffers))
+    written = [0]
+    def advance(n_bytes):
+        written[0] += n_bytes
+        if progress:
+            progress(written[0], total)
+
+    start = time.perf_counter()
+    for path, buffers in zip(paths, all_buffers):
+        if path.lower().endswith('.npz'):
+            write_npz(path, buffers, compress, advance)
+        else:
+            write_vtk_xml(path, buffers, compress, advance)
+    seconds = time.perf_counter() - start
+
+    return {'paths': paths, 'bytes': total, 'seconds': seconds,
+            'mb_per_s': total / 1024**2 / seconds if seconds else 0}
+
+def export_async(paths, meshes, compress=False, progress=None):
+    """Writes meshes on the background export thread
+
+    The mesh arrays are captured as views on the calling thread, so later
+    clips can replace the meshes while they are written.
+
+    Returns
+    -------
+    concurrent.futures.Future
+        Resolves to the export_meshes statistics
+
+    """
+    all_buffers = [mesh_buffers(mesh) for mesh in meshes]
+    return executor.submit(write_buffers, paths, all_buffers, compress,
+                           progress)
+
+def clip_and_write(paths, clip, bounds_list, compress=False, progress=None):
+    meshes = [clip(bounds) for bounds in bounds_list]
+    all_buffers = [mesh_buffers(mesh) for mesh in meshes]
+    return write_buffers(paths, all_buffers, compress, progress)
+
+def export_clips_async(paths, clip, bounds_list, compress=False, progress=None):
+    """Clips and writes a batch of meshes on the background export thread
+
+    Parameters
+    ----------
+    paths: list of str
+
+    clip: function
+        Returns the mesh clipped to one entry of bounds_list
+
+    bounds_list: list of lists
+
+    Returns
+    -------
+    concurrent.futures.Future
+        Resolves to the export_meshes statistics
+
+    """
+    return executor.submit(clip_and_write, paths, clip, bounds_list, compress,
+                           progress)
@@ -4,6 +4,13 @@ import pyvista as pv
 from pyvista import examples
 from scipy.ndimage import uniform_filter
 
+from library.adaptive_sampling import sparse_sample
+
+
+# Vector lengths treated as zero by the tube frames
+EPSILON = 1e-12
+
+
 def load_tube():
     theta = np.linspace(-4*np.pi, 4*np.pi, 100, endpoint=True)
     x = np.cos(theta)
@@ -24,6 +31,172 @@ def load_tube():
                     radius_factor=radius_factor)
     return tube
 
+def transport_normals(points, next_points, tangents, next_tangents, normals):
+    """Carries ring normals to the next centerline points without twisting them
+
+    Rotation-minimizing frames by double reflection (Wang et al. 2008),
+    one step for a batch of segments at once. Reflections about zero-length
+    vectors, from repeated points or a centerline turning back on itself,
+    are skipped, and segments whose result is degenerate keep their previous
+    normal, made perpendicular to the next tangent where possible.
+    """
+    def reflect(vectors, axis, length):
+        scale = np.divide(2 * np.einsum('ij,ij->i', axis, vectors), length,
+                          out=np.zeros_like(length), where=length > EPSILON ** 2)
+        return vectors - scale[:, None] * axis
+
+    def normalize(vectors, fallback):
+        length = np.linalg.norm(vectors, axis=1)
+        valid = np.isfinite(length) & (length > EPSILON)
+        return np.where(valid[:, None], vectors / np.where(valid, length, 1)[:, None],
+                        fallback)
+
+    step = next_points - points
+    step_length = np.einsum('ij,ij->i', step, step)
+    reflected_normals = reflect(normals, step, step_length)
+    reflected_tangents = reflect(tangents, step, step_length)
+
+    correction = next_tangents - reflected_tangents
+    correction_length = np.einsum('ij,ij->i', correction, correction)
+    next_normals = reflect(reflected_normals, correction, correction_length)
+
+    carried = normals - np.einsum('ij,ij->i', normals, next_tangents)[:, None] * next_tangents
+    return normalize(next_normals, normalize(carried, normals))
+
+def tube_network(centerlines, radii, n_sides=12):
+    """Builds a single tube mesh for a network of centerline segments
+
+    Uses the same per-point radius variation as load_tube, but generates
+    the geometry of every segment at once with NumPy instead of creating
+    a separate spline.tube() mesh for each segment.
+
+    Parameters
+    ----------
+    centerlines: list or tuple of (N, 3) arrays
+        Centerline coordinates of each segment. Segments need at least
+        two points.
+
+    radii: list or tuple of (N,) arrays or floats
+        Per-point radius of each segment, or a single radius per segment
+
+    n_sides: int, optional
+        Number of sides of each tube
+
+    Returns
+    -------
+    pv.PolyData
+        Quad surface of all tubes with 'segment_id' cell data and 'radius'
+        point data
+
+    """
+    lengths = np.array([len(line) for line in centerlines])
+    if np.any(lengths < 2):
+        raise ValueError('Each centerline must contain at least two points')
+
+    centers = np.concatenate(centerlines).astype(np.float64)
+    point_radii = np.concatenate([np.broadcast_to(np.asarray(r, dtype=np.float64), (n,))
+                                  for r, n in zip(radii, lengths)])
+    segment_ids = np.repeat(np.arange(len(lengths)), lengths)
+
+    # Segment start and end indices in the flattened arrays
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    # Tangents: central differences, one-sided at the segment ends
+    prev_ids = np.arange(centers.shape[0]) - 1
+    next_ids = np.arange(centers.shape[0]) + 1
+    prev_ids[starts] = starts
+    next_ids[ends - 1] = ends - 1
+    # Where the central difference vanishes, at repeated points or where the
+    # centerline turns back on itself, use the forward then the backward step
+    tangents = centers[next_ids] - centers[prev_ids]
+    for fallback in (centers[next_ids] - centers, centers - centers[prev_ids]):
+        degenerate = np.linalg.norm(tangents, axis=1) <= EPSILON
+        tangents[degenerate] = fallback[degenerate]
+    tangent_lengths = np.linalg.norm(tangents, axis=1)
+    degenerate = tangent_lengths <= EPSILON
+    tangents[~degenerate] /= tangent_lengths[~degenerate, None]
+    # Points repeated on both sides take the tangent of the previous point,
+    # or the z axis at the start of a segment
+    tangents[starts[degenerate[starts]]] = [0, 0, 1]
+
+    # Ring frames: the first ring of each segment crosses its tangent with
+    # the axis it is least aligned with, the following rings are rotated
+    # along with the centerline so consecutive rings do not twist
+    normals = np.empty_like(tangents)
+    first = tangents[starts]
+    reference = np.zeros_like(first)
+    reference[np.arange(first.shape[0]), np.argmin(np.abs(first), axis=1)] = 1
+    normals[starts] = np.cross(first, reference)
+    normals[starts] /= np.linalg.norm(normals[starts], axis=1)[:, None]
+    for step in range(1, lengths.max()):
+        current = starts[lengths > step] + step
+        repeated = current[degenerate[current]]
+        tangents[repeated] = tangents[repeated - 1]
+        normals[current] = transport_normals(centers[current - 1], centers[current],
+                                             tangents[current - 1], tangents[current],
+                                             normals[current - 1])
+    binormals = np.cross(tangents, normals)
+
+    # Ring points, n_sides per centerline point
+    angles = np.linspace(0, 2*np.pi, n_sides, endpoint=False)
+    offsets = (np.cos(angles)[None, :, None] * normals[:, None, :]
+               + np.sin(angles)[None, :, None] * binormals[:, None, :])
+    points = centers[:, None, :] + point_radii[:, None, None] * offsets
+    points = points.reshape(-1, 3)
+
+    # Quads between consecutive rings of the same segment
+    ring_starts = np.setdiff1d(np.arange(centers.shape[0]), ends - 1) * n_sides
+    sides = np.arange(n_sides)
+    next_sides = (sides + 1) % n_sides
+    quads = np.empty((ring_starts.shape[0], n_sides, 5), dtype=np.int64)
+    quads[..., 0] = 4
+    quads[..., 1] = ring_starts[:, None] + sides
+    quads[..., 2] = ring_starts[:, None] + next_sides
+    quads[..., 3] = ring_starts[:, None] + n_sides + next_sides
+    quads[..., 4] = ring_starts[:, None] + n_sides + sides
+
+    network = pv.PolyData(points, quads.ravel())
+    network.point_data['radius'] = np.repeat(point_radii, n_sides)
+    network.cell_data['segment_id'] = np.repeat(segment_ids[ring_starts // n_sides],
+                                                n_sides)
+    return network
+
+def random_network(n_segments=20000, points_per_segment=10, seed=0):
+    """Creates random wavy centerlines and radii for tube network testing
+
+    Parameters
+    ----------
+    n_segments: int, optional
+
+    points_per_segment: int, optional
+
+    seed: int, optional
+
+    Returns
+    -------
+    centerlines: list of (points_per_segment, 3) arrays
+
+    radii: list of (points_per_segment,) arrays
+
+    """
+    rng = np.random.default_rng(seed)
+    extent = n_segments ** (1/3) * 2
+    starts = rng.uniform(0, extent, (n_segments, 1, 3))
+    steps = rng.normal(0, 0.3, (n_segments, points_per_segment, 3))
+    steps[:, :, 2] += 0.4
+    lines = starts + np.cumsum(steps, axis=1)
+
+    # Same log-shaped radius variation as load_tube
+    r = np.log10(np.linspace(2, 10, points_per_segment)) / 10
+    scale = rng.uniform(0.5, 1.5, (n_segments, 1))
+    radii = r[None, :] * scale
+    return list(lines), list(radii)
+
+def load_tube_network():
+    centerlines, radii = random_network()
+    return tube_network(centerlines, radii)
+
 def load_grid():
     points_outer = np.random.normal(0, 20, 10000).reshape(100, 100, 1)
     points_outer[points_outer < 5] = 0
@@ -52,174 +225,197 @@ def load_st_helens():
     helens = examples.download_st_helens().warp_by_scalar()
     return helens
 
-def load_Laurent_lattice():
-
-    T = 1
-    G = -1
-
-
-    def f(ρ, θ, ϕ):
-        x = ρ * np.cos(θ) * np.sin(ϕ)
-        y = ρ * np.sin(θ) * np.sin(ϕ)
-        z = ρ * np.cos(ϕ)
-        sin_x = np.sin(x)
-        sin_y = np.sin(y)
-        sin_z = np.sin(z)
-        cos_x = np.cos(x)
-        cos_y = np.cos(y)
-        cos_z = np.cos(z)
-        return (
-            (
-                np.cos(
-                    x
-                    - (-sin_x * sin_y + cos_x * cos_z)
-                    * T
-                    / np.sqrt(
-                        (-sin_x * sin_y + cos_x * cos_z) ** 2
-                        + (-sin_y * sin_z + cos_y * cos_x) ** 2
-                        + (-sin_z * sin_x + cos_z * cos_y) ** 2
-                    )
+T = 1
+G = -1
+
+def laurent_field(ρ, θ, ϕ):
+    """Laurent lattice field in spherical coordinates, zero on the surface"""
+    x = ρ * np.cos(θ) * np.sin(ϕ)
+    y = ρ * np.sin(θ) * np.sin(ϕ)
+    z = ρ * np.cos(ϕ)
+    sin_x = np.sin(x)
+    sin_y = np.sin(y)
+    sin_z = np.sin(z)
+    cos_x = np.cos(x)
+    cos_y = np.cos(y)
+    cos_z = np.cos(z)
+    return (
+        (
+            np.cos(
+                x
+                - (-sin_x * sin_y + cos_x * cos_z)
+                * T
+                / np.sqrt(
+                    (-sin_x * sin_y + cos_x * cos_z) ** 2
+                    + (-sin_y * sin_z + cos_y * cos_x) ** 2
+                    + (-sin_z * sin_x + cos_z * cos_y) ** 2
                 )
-                * np.sin(
-                    y
-                    - (-sin_y * sin_z + cos_y * cos_x)
-                    * T
-                    / np.sqrt(
-                        (-sin_x * sin_y + cos_x * cos_z) ** 2
-                        + (-sin_y * sin_z + cos_y * cos_x) ** 2
-                        + (-sin_z * sin_x + cos_z * cos_y) ** 2
-                    )
+            )
+            * np.sin(
+                y
+                - (-sin_y * sin_z + cos_y * cos_x)
+                * T
+                / np.sqrt(
+                    (-sin_x * sin_y + cos_x * cos_z) ** 2
+                    + (-sin_y * sin_z + cos_y * cos_x) ** 2
+                    + (-sin_z * sin_x + cos_z * cos_y) ** 2
                 )
-                + np.cos(
-                    y
-                    - (-sin_y * sin_z + cos_y * cos_x)
-                    * T
-                    / np.sqrt(
-                        (-sin_x * sin_y + cos_x * cos_z) ** 2
-                        + (-sin_y * sin_z + cos_y * cos_x) ** 2
-                        + (-sin_z * sin_x + cos_z * cos_y) ** 2
-                    )
+            )
+            + np.cos(
+                y
+                - (-sin_y * sin_z + cos_y * cos_x)
+                * T
+                / np.sqrt(
+                    (-sin_x * sin_y + cos_x * cos_z) ** 2
+                    + (-sin_y * sin_z + cos_y * cos_x) ** 2
+                    + (-sin_z * sin_x + cos_z * cos_y) ** 2
                 )
-                * np.sin(
-                    z
-                    - (-sin_z * sin_x + cos_z * cos_y)
-                    * T
-                    / np.sqrt(
-                        (-sin_x * sin_y + cos_x * cos_z) ** 2
-                        + (-sin_y * sin_z + cos_y * cos_x) ** 2
-                        + (-sin_z * sin_x + cos_z * cos_y) ** 2
-                    )
+            )
+            * np.sin(
+                z
+                - (-sin_z * sin_x + cos_z * cos_y)
+                * T
+                / np.sqrt(
+                    (-sin_x * sin_y + cos_x * cos_z) ** 2
+                    + (-sin_y * sin_z + cos_y * cos_x) ** 2
+                    + (-sin_z * sin_x + cos_z * cos_y) ** 2
                 )
-                + np.cos(
-                    z
-                    - (-sin_z * sin_x + cos_z * cos_y)
-                    * T
-                    / np.sqrt(
-                        (-sin_x * sin_y + cos_x * cos_z) ** 2
-                        + (-sin_y * sin_z + cos_y * cos_x) ** 2
-                        + (-sin_z * sin_x + cos_z * cos_y) ** 2
-                    )
+            )
+            + np.cos(
+                z
+                - (-sin_z * sin_x + cos_z * cos_y)
+                * T
+                / np.sqrt(
+                    (-sin_x * sin_y + cos_x * cos_z) ** 2
+                    + (-sin_y * sin_z + cos_y * cos_x) ** 2
+                    + (-sin_z * sin_x + cos_z * cos_y) ** 2
                 )
-                * np.sin(
-                    x
-                    - (-sin_x * sin_y + cos_x * cos_z)
-                    * T
-                    / np.sqrt(
-                        (-sin_x * sin_y + cos_x * cos_z) ** 2
-                        + (-sin_y * sin_z + cos_y * cos_x) ** 2
-                        + (-sin_z * sin_x + cos_z * cos_y) ** 2
-                    )
+            )
+            * np.sin(
+                x
+                - (-sin_x * sin_y + cos_x * cos_z)
+                * T
+                / np.sqrt(
+                    (-sin_x * sin_y + cos_x * cos_z) ** 2
+                    + (-sin_y * sin_z + cos_y * cos_x) ** 2
+                    + (-sin_z * sin_x + cos_z * cos_y) ** 2
                 )
             )
-        ) * (
-            (
-                np.cos(
-                    x
-                    - (-sin_x * sin_y + cos_x * cos_z)
-                    * G
-                    / np.sqrt(
-                        (-sin_x * sin_y + cos_x * cos_z) ** 2
-                        + (-sin_y * sin_z + cos_y * cos_x) ** 2
-                        + (-sin_z * sin_x + cos_z * cos_y) ** 2
-                    )
+        )
+    ) * (
+        (
+            np.cos(
+                x
+                - (-sin_x * sin_y + cos_x * cos_z)
+                * G
+                / np.sqrt(
+                    (-sin_x * sin_y + cos_x * cos_z) ** 2
+                    + (-sin_y * sin_z + cos_y * cos_x) ** 2
+                    + (-sin_z * sin_x + cos_z * cos_y) ** 2
                 )
-                * np.sin(
-                    y
-                    - (-sin_y * sin_z + cos_y * cos_x)
-                    * G
-                    / np.sqrt(
-                        (-sin_x * sin_y + cos_x * cos_z) ** 2
-                        + (-sin_y * sin_z + cos_y * cos_x) ** 2
-                        + (-sin_z * sin_x + cos_z * cos_y) ** 2
-                    )
+            )
+            * np.sin(
+                y
+                - (-sin_y * sin_z + cos_y * cos_x)
+                * G
+                / np.sqrt(
+                    (-sin_x * sin_y + cos_x * cos_z) ** 2
+                    + (-sin_y * sin_z + cos_y * cos_x) ** 2
+                    + (-sin_z * sin_x + cos_z * cos_y) ** 2
                 )
-                + np.cos(
-                    y
-                    - (-sin_y * sin_z + cos_y * cos_x)
-                    * G
-                    / np.sqrt(
-                        (-sin_x * sin_y + cos_x * cos_z) ** 2
-                        + (-sin_y * sin_z + cos_y * cos_x) ** 2
-                        + (-sin_z * sin_x + cos_z * cos_y) ** 2
-                    )
+            )
+            + np.cos(
+                y
+                - (-sin_y * sin_z + cos_y * cos_x)
+                * G
+                / np.sqrt(
+                    (-sin_x * sin_y + cos_x * cos_z) ** 2
+                    + (-sin_y * sin_z + cos_y * cos_x) ** 2
+                    + (-sin_z * sin_x + cos_z * cos_y) ** 2
                 )
-                * np.sin(
-                    z
-                    - (-sin_z * sin_x + cos_z * cos_y)
-                    * G
-                    / np.sqrt(
-                        (-sin_x * sin_y + cos_x * cos_z) ** 2
-                        + (-sin_y * sin_z + cos_y * cos_x) ** 2
-                        + (-sin_z * sin_x + cos_z * cos_y) ** 2
-                    )
+            )
+            * np.sin(
+                z
+                - (-sin_z * sin_x + cos_z * cos_y)
+                * G
+                / np.sqrt(
+                    (-sin_x * sin_y + cos_x * cos_z) ** 2
+                    + (-sin_y * sin_z + cos_y * cos_x) ** 2
+                    + (-sin_z * sin_x + cos_z * cos_y) ** 2
                 )
-                + np.cos(
-                    z
-                    - (-sin_z * sin_x + cos_z * cos_y)
-                    * G
-                    / np.sqrt(
-                        (-sin_x * sin_y + cos_x * cos_z) ** 2
-                        + (-sin_y * sin_z + cos_y * cos_x) ** 2
-                        + (-sin_z * sin_x + cos_z * cos_y) ** 2
-                    )
+            )
+            + np.cos(
+                z
+                - (-sin_z * sin_x + cos_z * cos_y)
+                * G
+                / np.sqrt(
+                    (-sin_x * sin_y + cos_x * cos_z) ** 2
+                    + (-sin_y * sin_z + cos_y * cos_x) ** 2
+                    + (-sin_z * sin_x + cos_z * cos_y) ** 2
                 )
-                * np.sin(
-                    x
-                    - (-sin_x * sin_y + cos_x * cos_z)
-                    * G
-                    / np.sqrt(
-                        (-sin_x * sin_y + cos_x * cos_z) ** 2
-                        + (-sin_y * sin_z + cos_y * cos_x) ** 2
-                        + (-sin_z * sin_x + cos_z * cos_y) ** 2
-                    )
+            )
+            * np.sin(
+                x
+                - (-sin_x * sin_y + cos_x * cos_z)
+                * G
+                / np.sqrt(
+                    (-sin_x * sin_y + cos_x * cos_z) ** 2
+                    + (-sin_y * sin_z + cos_y * cos_x) ** 2
+                    + (-sin_z * sin_x + cos_z * cos_y) ** 2
                 )
             )
         )
+    )
+
+def sph2cart(sph):
+    ρ = sph[:, 0]
+    θ = sph[:, 1]
+    ϕ = sph[:, 2]
+    return np.array([
+        ρ * np.cos(θ) * np.sin(ϕ),
+        ρ * np.sin(θ) * np.sin(ϕ),
+        ρ * np.cos(ϕ)
+    ])
+
+LAURENT_LOWER = (0, 0, 0)
+LAURENT_UPPER = (8, pi, 2 * pi)
 
+def load_Laurent_lattice(resolution=200, adaptive=False):
+    """Contours the zero isosurface of the Laurent lattice field
 
-    def sph2cart(sph):
-        ρ = sph[:, 0]
-        θ = sph[:, 1]
-        ϕ = sph[:, 2]
-        return np.array([
-            ρ * np.cos(θ) * np.sin(ϕ),
-            ρ * np.sin(θ) * np.sin(ϕ),
-            ρ * np.cos(ϕ)
-        ])
+    Parameters
+    ----------
+    resolution: int, optional
+        Number of samples per axis of the spherical coordinate grid
 
+    adaptive: bool, optional
+        Only sample the field at full resolution in the blocks that the
+        surface passes through. Gives the same surface as the uniform grid
+        wherever the refinement found the surface; the block test is a
+        heuristic and can miss small features. The lattice surface runs
+        through most blocks, so this currently saves few evaluations, see
+        benchmarks/laurent_lattice.py.
 
-    # generate data grid for computing the values
-    Rho, Theta, Phi = np.mgrid[0:8:200j, 0:(pi):200j, 0 : (2 * pi) : 200j]
-    # create a structured grid
-    grid = pv.StructuredGrid(Rho, Theta, Phi)
-    # grid.points = np.transpose(sph2cart(grid.points))
+    Returns
+    -------
+    pv.PolyData
 
+    """
+    if adaptive:
+        grid, _ = sparse_sample(laurent_field, LAURENT_LOWER, LAURENT_UPPER,
+                                resolution)
+    else:
+        # generate data grid for computing the values
+        Rho, Theta, Phi = np.mgrid[0:8:resolution*1j, 0:(pi):resolution*1j,
+                                   0:(2 * pi):resolution*1j]
+        # create a structured grid
+        grid = pv.StructuredGrid(Rho, Theta, Phi)
+        values = laurent_field(Rho, Theta, Phi)
+        grid.point_data["values"] = values.ravel(order="F")
 
-    values = f(Rho, Theta, Phi)
-    grid.point_data["values"] = values.ravel(order="F")
     # compute one isosurface
-    isosurf = grid.contour(isosurfaces=[0])
+    isosurf = grid.contour(isosurfaces=[0], scalars="values")
     mesh = isosurf.extract_geometry()
     mesh.points = np.transpose(sph2cart(mesh.points))
     mesh.point_data["distance"] = np.linalg.norm(mesh.points, axis=1)
-    return mesh
\ No newline at end of file
+    return mesh
@@ -0,0 +1,187 @@
+import json
+import time
+from math import ceil
+
+import numpy as np
+import pyvista as pv
+
+from library import mesh_sources
+from library.clip_regions import region_from_dict
+from library.plot_actors import PlotActor, ClippingBox
+
+
+class InteractionRecorder:
+    """Writes timestamped UI actions to a JSON lines file
+
+    Each line holds the seconds since recording started, the event name,
+    and the event values, e.g.:
+        {"time": 1.25, "event": "bounds", "bounds": [0, 5, 0, 10, 0, 10]}
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w')
+        self.start = time.perf_counter()
+
+    def record(self, event, **values):
+        entry = {'time': round(time.perf_counter() - self.start, 6),
+                 'event': event}
+        entry.update(values)
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def load_session(path):
+    """Loads the events of a recorded session
+
+    Parameters
+    ----------
+    path: str
+
+    Returns
+    -------
+    list of dict
+
+    """
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class SessionPlayer:
+    """Replays recorded sessions against an off-screen plotter
+
+    Parameters
+    ----------
+    frame_time: float, optional
+        Frame budget in seconds used to count dropped frames
+
+    window_size: list, optional
+        Size of the off-screen render window
+
+    registry: MeshRegistry, optional
+        Sources of the recorded mesh names. Defaults to the built-in meshes.
+
+    """
+    def __init__(self, frame_time=1/60, window_size=(1024, 768),
+                 registry=None):
+        self.frame_time = frame_time
+        self.registry = registry or mesh_sources.builtin_registry()
+        self.plotter = pv.Plotter(off_screen=True, window_size=list(window_size))
+        self.plotActor = PlotActor(self.plotter)
+        self.boxWidget = ClippingBox(self.plotter, self.plotActor)
+
+    def play(self, events, paced=False):
+        """Replays events and measures the latency of each one
+
+        Parameters
+        ----------
+        events: list of dict
+            Events as returned by load_session
+
+        paced: bool, optional
+            Wait for each event's recorded time before applying it. Events
+            that start late count the lag towards their latency.
+
+        Returns
+        -------
+        list of tuple
+            (event name, latency in seconds)
+
+        """
+        latencies = []
+        start = time.perf_counter()
+        for event in events:
+            scheduled = start + event['time']
+            if paced:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            event_start = time.perf_counter()
+            self.apply(event)
+            # plotter.render() skips plotters that were never shown
+            self.plotter.ren_win.Render()
+            end = time.perf_counter()
+
+            if paced:
+                event_start = min(event_start, scheduled)
+            latencies.append((event['event'], end - event_start))
+        return latencies
+
+    def apply(self, event):
+        name = event['event']
+        if name == 'mesh':
+            self.load_mesh(event['name'], event.get('path'))
+        elif name == 'bounds':
+            self.boxWidget.update_position(event['bounds'])
+        elif name in ('drag', 'drag_end'):
+            self.boxWidget.PlaceWidget(event['bounds'])
+            self.boxWidget.drag_to(event['bounds'], final=name == 'drag_end')
+        elif name == 'clip':
+            self.boxWidget.update_mesh_clip()
+        elif name == 'reset_clip':
+            self.boxWidget.reset_mesh_clip()
+        elif name == 'realtime':
+            self.boxWidget.realtime_clipping = event['enabled']
+        elif name == 'dragging':
+            self.boxWidget.toggle_dragging(event['enabled'])
+        elif name == 'backend':
+            self.plotActor.clip_backend = event['backend']
+        elif name == 'cross_sections':
+            self.boxWidget.toggle_cross_sections(event['enabled'])
+        elif name == 'regions':
+            self.plotActor.regions = [region_from_dict(region)
+                                      for region in event['regions']]
+            self.plotActor.region_mode = event['mode']
+        elif name == 'scale':
+            self.plotter.scale[event['axis']] = event['value']
+            self.plotter.set_scale()
+
+    def load_mesh(self, name, path=None):
+        self.plotter.remove_actor(self.plotActor.clipped)
+        self.plotActor.reset()
+        if path and name not in self.registry:
+            self.registry.register_file(path, name)
+        if name not in self.registry:
+            return
+
+        self.plotActor.load_original(self.registry.load(name))
+        self.plotActor.show(self.plotActor.original, reset_camera=None)
+        self.boxWidget.bounds = self.plotActor.original.bounds
+
+    def report(self, latencies):
+        """Summarizes replay latencies
+
+        Parameters
+        ----------
+        latencies: list of tuple
+            Output of play
+
+        Returns
+        -------
+        dict
+            Per-event-type and overall latency percentiles in milliseconds,
+            event counts, and dropped frames
+
+        """
+        groups = {}
+        for name, latency in latencies:
+            groups.setdefault(name, []).append(latency)
+        groups['all'] = [latency for _, latency in latencies]
+
+        summary = {}
+        for name, values in groups.items():
+            if not values:
+                continue
+            values = np.array(values) * 1000
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            dropped = sum(max(0, ceil(v / 1000 / self.frame_time) - 1)
+                          for v in values)
+            summary[name] = {'count': len(values), 'p50': p50, 'p90': p90,
+                             'p99': p99, 'max': values.max(),
+                             'dropped_frames': dropped}
+        return summary
+
+    def close(self):
+        self.plotter.close()
@@ -0,0 +1,220 @@
+import gc
+import logging
+import os
+import sys
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 ** 2
+
+
+def psutil_memory():
+    """Returns psutil's memory info of the process, or None without psutil"""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info()
+
+def max_rss():
+    """Returns the lifetime peak RSS in bytes
+
+    Read from getrusage on Unix. Elsewhere psutil is used if installed,
+    otherwise 0 is returned.
+    """
+    try:
+        import resource
+    except ImportError:
+        info = psutil_memory()
+        if info is None:
+            return 0
+        # peak_wset is the peak working set on Windows
+        return getattr(info, 'peak_wset', info.rss)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in KB on Linux
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def current_rss():
+    """Returns the resident set size of the process in bytes
+    
+    Falls back to psutil, then to the lifetime peak, where /proc is not
+    available.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        info = psutil_memory()
+        return max_rss() if info is None else info.rss
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+def reset_peak_rss():
+    """Resets the kernel's peak RSS (VmHWM) counter of the process
+
+    Returns
+    -------
+    bool
+        False if the kernel does not support resetting the counter
+
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return True
+
+def peak_rss():
+    """Returns the peak resident set size (VmHWM) of the process in bytes"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return max_rss()
+
+def dataset_memory(datasets):
+    """Returns the memory held by VTK datasets in bytes
+
+    Parameters
+    ----------
+    datasets: list of vtkDataObject
+        None entries are ignored
+
+    """
+    return sum(mesh.GetActualMemorySize() * 1024 for mesh in datasets
+               if mesh is not None)
+
+
+class MemoryMonitor:
+    """Tracks memory watermarks of operations and enforces a memory budget
+
+    Parameters
+    ----------
+    budget_mb: float, optional
+        Process memory budget in MB. Defaults to the
+        CLIP_DEMO_MEMORY_BUDGET_MB environment variable, or no budget.
+
+    """
+    def __init__(self, budget_mb=None):
+        if budget_mb is None and os.environ.get('CLIP_DEMO_MEMORY_BUDGET_MB'):
+            budget_mb = float(os.environ['CLIP_DEMO_MEMORY_BUDGET_MB'])
+        self.budget = budget_mb * MB if budget_mb else None
+        self.watermarks = {}
+        self.releasers = []
+
+    def register_releaser(self, name, callback):
+        """Registers a callback that frees memory when over budget
+
+        Releasers are called in registration order until the process is
+        back under its budget.
+
+        Parameters
+        ----------
+        name: str
+            Description used in the log
+
+        callback: function
+            Frees memory and returns an estimate of the bytes freed
+
+        """
+        self.releasers.append((name, callback))
+
+    @contextmanager
+    def track(self, operation, datasets=None, estimate=0):
+        """Records the memory watermarks of an operation
+
+        Parameters
+        ----------
+        operation: str
+            Name of the operation, e.g. 'load Brain' or 'clip'
+
+        datasets: function, optional
+            Returns the datasets whose VTK memory should be sampled
+
+        estimate: int, optional
+            Expected number of bytes the operation will allocate. Memory is
+            released beforehand if it would push the process over budget.
+
+        """
+        self.enforce_budget(estimate, operation)
+
+        datasets = datasets or list
+        rss_before = current_rss()
+        vtk_before = dataset_memory(datasets())
+        has_peak = reset_peak_rss()
+        try:
+            yield
+        finally:
+            rss_after = current_rss()
+            peak = peak_rss() if has_peak else max(rss_before, rss_after)
+            vtk_after = dataset_memory(datasets())
+
+            mark = self.watermarks.setdefault(operation, {'count': 0,
+                                                          'peak_rss': 0,
+                                                          'peak_delta': 0})
+            mark['count'] += 1
+            mark['peak_rss'] = max(mark['peak_rss'], peak)
+            mark['peak_delta'] = max(mark['peak_delta'], peak - rss_before)
+            mark['rss_after'] = rss_after
+            mark['vtk_before'] = vtk_before
+            mark['vtk_after'] = vtk_after
+            logger.debug('%s: RSS %.1f -> %.1f MB (peak %.1f MB), '
+                         'VTK datasets %.1f -> %.1f MB', operation,
+                         rss_before / MB, rss_after / MB, peak / MB,
+                         vtk_before / MB, vtk_after / MB)
+
+            self.enforce_budget(0, f'after {operation}')
+
+    def enforce_budget(self, estimate=0, reason=''):
+        """Calls the releasers until RSS plus the estimate fits the budget
+
+        Parameters
+        ----------
+        estimate: int, optional
+            Bytes about to be allocated
+
+        reason: str, optional
+            Operation that triggered the check, used in the log
+
+        Returns
+        -------
+        bool
+            True if the process is within its budget
+
+        """
+        if self.budget is None:
+            return True
+
+        for name, release in self.releasers:
+            rss = current_rss()
+            if rss + estimate <= self.budget:
+                return True
+
+            freed = release()
+            gc.collect()
+            logger.warning('Memory budget of %.0f MB would be exceeded by %s '
+                           '(RSS %.1f MB + %.1f MB expected): released %s, '
+                           '%.1f MB', self.budget / MB, reason or 'operation',
+                           rss / MB, estimate / MB, name, (freed or 0) / MB)
+
+        within = current_rss() + estimate <= self.budget
+        if not within:
+            logger.error('Memory budget of %.0f MB exceeded by %s with '
+                         'nothing left to release', self.budget / MB,
+                         reason or 'operation')
+        return within
+
+    def report(self):
+        """Returns the recorded watermarks as printable lines"""
+        lines = []
+        for operation, mark in self.watermarks.items():
+            lines.append(f"{operation}: {mark['count']}x, "
+                         f"peak RSS {mark['peak_rss'] / MB:.1f} MB "
+                         f"(+{mark['peak_delta'] / MB:.1f} MB), "
+                         f"VTK datasets {mark['vtk_after'] / MB:.1f} MB")
+        return lines
@@ -0,0 +1,130 @@
+import os
+
+from library import helpers
+from library.readers import read_mesh
+
+
+MB = 1024 ** 2
+
+FILE_TYPES = {'.stl': 'PolyData', '.ply': 'PolyData', '.obj': 'PolyData',
+              '.vtp': 'PolyData', '.vtu': 'UnstructuredGrid',
+              '.vti': 'UniformGrid', '.vts': 'StructuredGrid',
+              '.vtk': 'DataSet'}
+
+
+class MeshSource:
+    """A named mesh that is only loaded when requested
+
+    Parameters
+    ----------
+    name: str
+        Name shown in the UI
+
+    loader: function
+        Called without arguments to create the mesh
+
+    kind: str, optional
+        Type of the dataset, e.g. 'PolyData'
+
+    estimated_size: int, optional
+        Approximate memory of the loaded mesh in bytes
+
+    path: str, optional
+        File the mesh is read from
+
+    """
+    def __init__(self, name, loader, kind=None, estimated_size=0, path=None):
+        self.name = name
+        self.loader = loader
+        self.kind = kind
+        self.estimated_size = estimated_size
+        self.path = path
+
+    def load(self):
+        return self.loader()
+
+    def description(self):
+        text = self.kind or 'Mesh'
+        if self.estimated_size:
+            text += f", ~{self.estimated_size / MB:.0f} MB"
+        if self.path:
+            text += f"\n{self.path}"
+        return text
+
+
+class MeshRegistry:
+    """Ordered collection of mesh sources"""
+    def __init__(self):
+        self.sources = {}
+
+    def register(self, name, loader, kind=None, estimated_size=0, path=None):
+        """Registers a mesh source without loading it
+
+        Returns
+        -------
+        MeshSource
+
+        """
+        source = MeshSource(name, loader, kind, estimated_size, path)
+        self.sources[name] = source
+        return source
+
+    def register_file(self, path, name=None):
+        """Registers a mesh file, read with the memory-mapped readers
+
+        Parameters
+        ----------
+        path: str
+
+        name: str, optional
+            Defaults to the file name
+
+        Returns
+        -------
+        MeshSource
+
+        """
+        path = os.path.abspath(path)
+        if name is None:
+            name = os.path.basename(path)
+        extension = os.path.splitext(path)[1].lower()
+        return self.register(name, lambda: read_mesh(path),
+                             kind=FILE_TYPES.get(extension, 'DataSet'),
+                             estimated_size=os.path.getsize(path), path=path)
+
+    def names(self):
+        return list(self.sources)
+
+    def load(self, name):
+        return self.sources[name].load()
+
+    def __getitem__(self, name):
+        return self.sources[name]
+
+    def __contains__(self, name):
+        return name in self.sources
+
+    def __iter__(self):
+        return iter(self.sources.values())
+
+
+def builtin_registry():
+    """Creates a registry of the demo meshes from helpers
+
+    Returns
+    -------
+    MeshRegistry
+
+    """
+    registry = MeshRegistry()
+    registry.register('Tube', helpers.load_tube, 'PolyData', 0.2 * MB)
+    registry.register('Tube Network', helpers.load_tube_network, 'PolyData',
+                      170 * MB)
+    registry.register('Grid', helpers.load_grid, 'StructuredGrid', 0.5 * MB)
+    registry.register('Foot Bones', helpers.load_foot, 'PolyData', 2 * MB)
+    registry.register('Mount St. Helens', helpers.load_st_helens,
+                      'StructuredGrid', 4 * MB)
+    registry.register('Brain', helpers.load_brain, 'UniformGrid', 30 * MB)
+    registry.register('Laurent Lattice', helpers.load_Laurent_lattice,
+                      'PolyData', 200 * MB)
+    return registry
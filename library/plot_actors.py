@@ -1,18 +1,209 @@
+import os
+import time
+
 import vtk
+import numpy as np
+import pyvista as pv
+from vtk.util.numpy_support import numpy_to_vtk
+
+from library import exporters
+from library.clip_regions import clip_regions
+from library.cross_sections import CrossSections
+from library.triangle_clip import clip_triangles, triangle_surface
+from library.memory_monitor import MemoryMonitor, dataset_memory
+
+
 class PlotActor:
-    def __init__(self, plotter):
+    def __init__(self, plotter, monitor=None):
         self.plotter = plotter
+        self.recorder = None
+        self.clip_backend = 'vtk'
+        self.monitor = monitor or MemoryMonitor()
+        self.monitor.register_releaser('plot actor cache', self.clear_cache)
+        self.monitor.register_releaser('stale plotter mesh', self.release_stale)
         self.reset()
         return
 
     def load_original(self, mesh):
         self.original = mesh
         self.bounds = mesh.bounds
+        self.has_normals = self.compute_normals()
+    
+    def compute_normals(self):
+        """Stores smooth point normals on the original mesh
+        
+        Clip results interpolate the normals with the other point data, so
+        they can be rendered without computing normals on every clip.
+        Meshes with interior points, e.g. volumes, are left without normals
+        and are shaded per clip.
+        
+        Returns
+        -------
+        bool
+            True if the original has point normals
+        """
+        mesh = self.original
+        if mesh.GetPointData().GetNormals() is not None:
+            return True
+        if (isinstance(mesh, (pv.UniformGrid, pv.StructuredGrid))
+                and min(mesh.dimensions) > 1):
+            return False
+        
+        # Same normals as smooth_shading in add_mesh
+        if isinstance(mesh, pv.PolyData):
+            surface = mesh.compute_normals(cell_normals=False)
+            normals = surface.point_data['Normals']
+        else:
+            surface = mesh.extract_surface(pass_pointid=True)
+            if surface.n_points != mesh.n_points:
+                return False
+            surface = surface.compute_normals(cell_normals=False)
+            normals = np.empty((mesh.n_points, 3), dtype=np.float32)
+            normals[surface.point_data['vtkOriginalPointIds']] = surface.point_data['Normals']
+        
+        # Set through VTK so the normals do not become the active scalars
+        vtk_normals = numpy_to_vtk(np.asarray(normals), deep=True)
+        vtk_normals.SetName('Normals')
+        mesh.GetPointData().SetNormals(vtk_normals)
+        return True
     
     def reset(self):
+        if getattr(self, 'sections', None):
+            self.show_sections([])
         self.original = None
         self.clipped = None
+        self.sections = []
+        self.clip_result = None
+        self.regions = []
+        self.region_mode = 'union'
+        self.has_normals = False
+        self.cache = {}
+        self.clip_inputs = {}
         self.bounds = [0, 10, 0, 10, 0, 10]
+        self.release_stale()
+    
+    def displayed(self):
+        """Returns the dataset rendered by the clipped actor"""
+        if self.clipped is None:
+            return None
+        return self.clipped.GetMapper().GetInput()
+    
+    def datasets(self):
+        derived = list(self.cache.values()) + list(self.clip_inputs.values())
+        return [self.original, self.clip_result, self.displayed()] + [
+            item for item in derived if isinstance(item, vtk.vtkDataObject)]
+    
+    def clear_cache(self):
+        """Drops datasets and arrays derived from the original mesh
+        
+        Returns
+        -------
+        int
+            Estimated bytes freed
+        """
+        freed = sum(getattr(item, 'nbytes', 0) for item in self.cache.values())
+        freed += dataset_memory([item for item in self.cache.values()
+                                 if isinstance(item, vtk.vtkDataObject)])
+        self.cache.clear()
+        return freed
+    
+    def release_stale(self):
+        """Drops the plotter's reference to the last mesh added to it
+        
+        pyvista keeps the last mesh passed to add_mesh on the plotter, which
+        keeps a removed clip result alive until the next one is added.
+        
+        Returns
+        -------
+        int
+            Estimated bytes freed
+        """
+        mesh = getattr(self.plotter, 'mesh', None)
+        if mesh is None or mesh is self.displayed():
+            return 0
+        freed = dataset_memory([mesh])
+        self.plotter.mesh = None
+        return freed
+    
+    def clip_function(self, copy=False):
+        """Returns a function that clips the original with the current settings
+        
+        With clip regions, the mesh is clipped in one pass to the union or
+        intersection of the regions, within the bounds. The 'numpy' backend
+        clips surfaces with vectorized triangle clipping, volumes always use
+        the VTK filter. The settings are captured, so the function can run
+        on the export thread while the controls change.
+        
+        Parameters
+        ----------
+        copy: bool, optional
+            Clip shallow copies of the meshes, so a function used on another
+            thread does not share a VTK pipeline input with the GUI clips
+        """
+        original = self.original
+        regions, mode = list(self.regions), self.region_mode
+        surface = None
+        if not regions and self.clip_backend == 'numpy':
+            surface = self.triangle_surface()
+        if copy:
+            original = original.copy(deep=False)
+            surface = surface.copy(deep=False) if surface is not None else None
+        
+        def clip(bounds):
+            if regions:
+                return clip_regions(original, regions, mode, bounds)
+            elif surface is not None:
+                return clip_triangles(surface, bounds)
+            return original.clip_box(bounds, invert=False)
+        return clip
+    
+    def clip(self, bounds):
+        """Returns the original mesh clipped to axis-aligned bounds"""
+        self.clip_result = self.clip_function()(bounds)
+        return self.clip_result
+    
+    def show(self, mesh, reset_camera=True):
+        """Replaces the rendered clip result with a new mesh
+        
+        Meshes carrying the original's point normals are Phong shaded with
+        them instead of having add_mesh recompute normals.
+        """
+        self.plotter.remove_actor(self.clipped)
+        self.clipped = self.plotter.add_mesh(mesh, 
+                                             smooth_shading=not self.has_normals,
+                                             show_scalar_bar=False,
+                                             reset_camera=reset_camera)
+        if self.has_normals:
+            self.clipped.GetProperty().SetInterpolationToPhong()
+    
+    def triangle_surface(self):
+        """Returns the triangulated surface of the original, built on first use
+        
+        Kept until reset instead of in the cache: every NumPy clip needs it,
+        so releasing it under memory pressure would rebuild it on the next
+        clip and raise the peak instead.
+        """
+        if 'triangle_surface' not in self.clip_inputs:
+            self.clip_inputs['triangle_surface'] = triangle_surface(self.original)
+        return self.clip_inputs['triangle_surface']
+    
+    def cross_sections(self):
+        """Returns the cross-section helper of the original, built on first use"""
+        if 'cross_sections' not in self.cache:
+            self.cache['cross_sections'] = CrossSections(self.original)
+        return self.cache['cross_sections']
+    
+    def show_sections(self, meshes):
+        """Replaces the rendered cross-sections"""
+        for actor in self.sections:
+            self.plotter.remove_actor(actor)
+        self.sections = [self.plotter.add_mesh(mesh, show_scalar_bar=False,
+                                               line_width=3, reset_camera=False)
+                         for mesh in meshes if mesh is not None]
+    
+    def record(self, event, **values):
+        if self.recorder:
+            self.recorder.record(event, **values)
         
 
 class ClippingBox(vtk.vtkBoxWidget):
@@ -21,45 +212,196 @@ class ClippingBox(vtk.vtkBoxWidget):
         self.plotter = plotter
         self.plotActor = plotActor
         self.realtime_clipping = False
+        self.cross_section_mode = False
+        
+        # Direct dragging of the box in the viewport
+        self.dragging_enabled = False
+        self.bounds_changed = None
+        self.frame_time = 1 / 30
+        self.clip_seconds = 0
+        self.last_clip_end = 0
         
         self.HandlesOff()
         self.GetHandleProperty().SetOpacity(0)
         self.GetOutlineProperty().SetColor((1,1,1))
-        self.SetInteractor(plotter.iren.interactor)
+        if plotter.iren is not None:
+            self.SetInteractor(plotter.iren.interactor)
         self.SetCurrentRenderer(plotter.renderer)
         self.SetPlaceFactor(1)
         self.SetRotationEnabled(False)
         self.SetTranslationEnabled(True)
         self.PlaceWidget([0, 1, 0, 1, 0, 1])
-        self.On()
-        # self.AddObserver(vtk.vtkCommand.EndInteractionEvent, self.pass_planes)
-        # _the_callback(box_widget, None)
+        if self.GetInteractor():
+            self.On()
+        self.AddObserver(vtk.vtkCommand.InteractionEvent, self.drag_update)
+        self.AddObserver(vtk.vtkCommand.EndInteractionEvent, self.drag_finished)
         
         self.toggle_opacity(False)
         
     def update_position(self, bounds):
         self.PlaceWidget(bounds)
         self.bounds = bounds
-        self.plotter.update()
-        if self.realtime_clipping:
-            self.update_mesh_clip()
+        self.update_view()
+        self.plotActor.record('bounds', bounds=list(bounds))
+        if self.cross_section_mode:
+            self.update_cross_sections()
+        elif self.realtime_clipping:
+            self.clip_mesh()
                 
+    def update_view(self):
+        # Off-screen plotters have no running interactor to update, session
+        # replays render them after every event instead
+        if not getattr(self.plotter, 'off_screen', False):
+            self.plotter.update()
+    
     def update_mesh_clip(self):
-        new_clipped = self.plotActor.original.clip_box(self.bounds, invert=False)
+        self.plotActor.record('clip')
+        if self.cross_section_mode:
+            self.update_cross_sections()
+        else:
+            self.clip_mesh()
+    
+    def toggle_cross_sections(self, enabled):
+        """Switches between the 3D clip and X/Y/Z cross-sections at the box center"""
+        self.cross_section_mode = enabled
+        self.plotActor.record('cross_sections', enabled=enabled)
+        if self.plotActor.original is None:
+            return
+        if enabled:
+            self.plotActor.clipped.SetVisibility(False)
+            self.update_cross_sections()
+        else:
+            self.plotActor.show_sections([])
+            self.plotActor.clipped.SetVisibility(True)
+            self.clip_mesh()
+    
+    def update_cross_sections(self):
+        sections = self.plotActor.cross_sections()
+        meshes = [sections.slice(axis, (self.bounds[axis*2] + 
+                                        self.bounds[axis*2+1]) / 2)
+                  for axis in range(3)]
+        self.plotActor.show_sections(meshes)
+    
+    def widget_bounds(self):
+        """Returns the bounds of the box as currently placed in the viewport"""
+        box = vtk.vtkPolyData()
+        self.GetPolyData(box)
+        return list(box.GetBounds())
+    
+    def toggle_dragging(self, enabled):
+        """Shows the box with handles so it can be moved and resized in the viewport"""
+        self.dragging_enabled = enabled
+        self.plotActor.record('dragging', enabled=enabled)
+        if enabled:
+            self.HandlesOn()
+        else:
+            self.HandlesOff()
+        self.GetHandleProperty().SetOpacity(int(enabled))
+        self.toggle_opacity(enabled)
+        self.update_view()
+    
+    def drag_update(self, caller, event):
+        """Follows a drag of the box, clipping at most once per throttle interval
+        
+        The next clip waits for the target frame time, or for as long as the
+        last clip took if that was longer, so slow clips never take more than
+        about half of the drag and the box itself keeps rendering smoothly.
+        """
+        if self.plotActor.original is None:
+            return
+        self.bounds = self.widget_bounds()
+        if self.bounds_changed:
+            self.bounds_changed(self.bounds)
         
-        self.plotter.remove_actor(self.plotActor.clipped)
-        self.plotActor.clipped = self.plotter.add_mesh(new_clipped,
-                                                       smooth_shading=True,
-                                                        show_scalar_bar=False,
-                                                        reset_camera=True)
+        interval = max(self.frame_time - self.clip_seconds, self.clip_seconds)
+        if time.perf_counter() - self.last_clip_end < interval:
+            return
+        start = time.perf_counter()
+        self.drag_to(self.bounds)
+        self.last_clip_end = time.perf_counter()
+        self.clip_seconds = self.last_clip_end - start
     
+    def drag_finished(self, caller, event):
+        """Clips to the exact final bounds when the drag is released"""
+        if self.plotActor.original is None:
+            return
+        self.bounds = self.widget_bounds()
+        if self.bounds_changed:
+            self.bounds_changed(self.bounds)
+        self.drag_to(self.bounds, final=True)
+        self.last_clip_end = 0
+    
+    def drag_to(self, bounds, final=False):
+        """Clips to the bounds of a dragged box without moving the camera
+        
+        Each throttled clip is recorded, so replays reproduce the drag.
+        """
+        self.bounds = list(bounds)
+        self.plotActor.record('drag_end' if final else 'drag', bounds=self.bounds)
+        if self.cross_section_mode:
+            self.update_cross_sections()
+        else:
+            self.clip_mesh(reset_camera=False)
+    
+    def clip_mesh(self, reset_camera=True):
+        estimate = dataset_memory([self.plotActor.original])
+        with self.plotActor.monitor.track('clip', self.plotActor.datasets,
+                                          estimate):
+            self.plotActor.show(self.plotActor.clip(self.bounds),
+                                reset_camera=reset_camera)
+    
+    def export_clip(self, path, compress=False, progress=None, 
+                    bounds_list=None):
+        """Writes the current clip result, or a batch of clips, in the background
+        
+        Parameters
+        ----------
+        path: str
+            Output file. '.npz' writes an NPZ archive, other extensions
+            write VTK XML (.vtp or .vtu) with raw appended data. Batches
+            are numbered path_0000.ext, path_0001.ext, ...
+        
+        compress: bool, optional
+        
+        progress: function, optional
+            Called from the export thread with (bytes written, total bytes)
+        
+        bounds_list: list of lists, optional
+            Clip bounds of a batch export. The clips use the current regions
+            and backend and are done on the export thread.
+        
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to the written paths and throughput statistics
+        """
+        if bounds_list is None:
+            mesh = self.plotActor.clip_result
+            meshes = [mesh if mesh is not None else self.plotActor.original]
+            paths = [path]
+        else:
+            root, extension = os.path.splitext(path)
+            paths = [f'{root}_{i:04d}{extension}' for i in range(len(bounds_list))]
+            clip = self.plotActor.clip_function(copy=True)
+            return exporters.export_clips_async(paths, clip, bounds_list,
+                                                compress, progress)
+        return exporters.export_async(paths, meshes, compress, progress)
+        
     def reset_mesh_clip(self):
+        self.plotActor.record('reset_clip')
         self.bounds = self.plotActor.original.bounds
-        self.update_mesh_clip()
+        if self.cross_section_mode:
+            self.update_cross_sections()
+        else:
+            self.clip_mesh()
         self.plotter.reset_camera()
         
     def toggle_opacity(self, in_view=False):
+        # A draggable box stays in view
+        in_view = in_view or self.dragging_enabled
         self.GetOutlineProperty().SetOpacity(int(in_view))
+        if not self.GetInteractor():
+            return
         if not in_view:
             self.Off()
         else:
@@ -0,0 +1,349 @@
+import os
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pyvista as pv
+import vtk
+from vtk.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+
+
+# Number of elements copied per chunk when a converted copy is needed
+CHUNK_SIZE = 2 ** 20
+
+STL_DTYPE = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)),
+                      ('attribute', '<u2')])
+
+# The raw bytes of an STL corner, used to find shared corners
+STL_KEY = np.dtype((np.void, 12))
+
+PLY_TYPES = {'char': 'i1', 'uchar': 'u1', 'short': 'i2', 'ushort': 'u2',
+             'int': 'i4', 'uint': 'u4', 'float': 'f4', 'double': 'f8',
+             'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+             'int32': 'i4', 'uint32': 'u4', 'float32': 'f4', 'float64': 'f8'}
+
+VTK_XML_TYPES = {'Int8': 'i1', 'UInt8': 'u1', 'Int16': 'i2', 'UInt16': 'u2',
+                 'Int32': 'i4', 'UInt32': 'u4', 'Int64': 'i8', 'UInt64': 'u8',
+                 'Float32': 'f4', 'Float64': 'f8'}
+
+
+def read_mesh(path):
+    """Reads a mesh file, memory-mapping binary STL, PLY and VTK XML files
+
+    Binary data is mapped copy-on-write instead of read into memory, and
+    only arrays that need a type conversion are copied, in chunks. Files
+    the memory-mapped readers do not support are read with pv.read.
+
+    Parameters
+    ----------
+    path: str
+
+    Returns
+    -------
+    pv.DataSet
+
+    """
+    extension = os.path.splitext(path)[1].lower()
+    mesh = None
+    if extension == '.stl':
+        mesh = read_stl(path)
+    elif extension == '.ply':
+        mesh = read_ply(path)
+    elif extension in ('.vtp', '.vtu'):
+        mesh = read_vtk_xml(path)
+
+    if mesh is None:
+        mesh = pv.read(path)
+    return mesh
+
+def chunked_copy(source, dtype):
+    """Copies an array into a new array of another dtype in chunks
+
+    Only one chunk of the source is paged in at a time, so converting a
+    memory-mapped array does not hold two full copies of it in memory.
+
+    """
+    output = np.empty(source.shape, dtype=dtype)
+    for start in range(0, source.shape[0], CHUNK_SIZE):
+        output[start:start+CHUNK_SIZE] = source[start:start+CHUNK_SIZE]
+    return output
+
+def new_id_array(size):
+    """Allocates a vtkIdTypeArray and returns it with a NumPy view of its memory"""
+    array = vtk.vtkIdTypeArray()
+    array.SetNumberOfValues(size)
+    if size == 0:
+        return array, np.empty(0, dtype=np.int64)
+    return array, vtk_to_numpy(array)
+
+def id_array(array, copy=True):
+    """Converts an integer array to a vtkIdTypeArray
+
+    vtkCellArray.SetData shares the memory of its arrays without keeping a
+    reference to them, so by default the values are copied, in chunks,
+    into memory VTK owns. Only pass copy=False for memory that outlives
+    the cells, e.g. shared memory segments held open elsewhere.
+    """
+    if isinstance(array, vtk.vtkIdTypeArray):
+        return array
+    if not copy:
+        return numpy_to_vtk(array, deep=False, array_type=vtk.VTK_ID_TYPE)
+    result, view = new_id_array(array.shape[0])
+    for start in range(0, array.shape[0], CHUNK_SIZE):
+        view[start:start+CHUNK_SIZE] = array[start:start+CHUNK_SIZE]
+    return result
+
+def cell_array(offsets, connectivity, copy=True):
+    """Creates a vtkCellArray from offsets (with a leading 0) and connectivity
+
+    offsets and connectivity may be NumPy arrays or vtkIdTypeArrays, see
+    id_array for copy.
+    """
+    cells = vtk.vtkCellArray()
+    cells.SetData(id_array(offsets, copy), id_array(connectivity, copy))
+    return cells
+
+def triangle_mesh(points, connectivity):
+    """Creates a PolyData of triangles from (3n,) connectivity
+
+    connectivity may be a NumPy array or a vtkIdTypeArray.
+    """
+    if isinstance(connectivity, vtk.vtkIdTypeArray):
+        n_ids = connectivity.GetNumberOfValues()
+    else:
+        n_ids = connectivity.shape[0]
+    mesh = pv.PolyData()
+    mesh.points = points
+    offsets = np.arange(0, n_ids + 1, 3, dtype=np.int64)
+    mesh.SetPolys(cell_array(offsets, connectivity))
+    return mesh
+
+
+## STL
+def read_stl(path):
+    """Reads a binary STL file through a memory map
+
+    STL stores the corners of every triangle separately. Corners are merged
+    a chunk of triangles at a time against a sorted table of the points
+    found so far, so memory stays near the size of the merged mesh instead
+    of several copies of the file.
+
+    Returns None for ASCII files.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(84)
+    if len(header) < 84:
+        return None
+    n_triangles = int(np.frombuffer(header, dtype='<u4', count=1, offset=80)[0])
+    if os.path.getsize(path) != 84 + STL_DTYPE.itemsize * n_triangles:
+        return None
+
+    triangles = np.memmap(path, dtype=STL_DTYPE, mode='r', offset=84,
+                          shape=(n_triangles,))
+    # Written straight into VTK's connectivity array, so it is not copied
+    connectivity_ids, connectivity = new_id_array(n_triangles * 3)
+    table_keys = np.empty(0, dtype=STL_KEY)
+    table_ids = np.empty(0, dtype=np.int64)
+    points, n_points = [], 0
+    for start in range(0, n_triangles, CHUNK_SIZE):
+        stop = min(start + CHUNK_SIZE, n_triangles)
+        vertices = np.ascontiguousarray(triangles['vertices'][start:stop]).reshape(-1, 3)
+        keys = vertices.view(STL_KEY).ravel()
+        keys, first, inverse = np.unique(keys, return_index=True,
+                                         return_inverse=True)
+
+        # Look the chunk's corners up in the points merged so far
+        position = np.searchsorted(table_keys, keys)
+        found = position < table_keys.shape[0]
+        found[found] = table_keys[position[found]] == keys[found]
+        new = ~found
+        ids = np.empty(keys.shape[0], dtype=np.int64)
+        ids[found] = table_ids[position[found]]
+        ids[new] = np.arange(n_points, n_points + np.count_nonzero(new))
+        n_points += np.count_nonzero(new)
+
+        points.append(vertices[first[new]])
+        table_keys = np.insert(table_keys, position[new], keys[new])
+        table_ids = np.insert(table_ids, position[new], ids[new])
+        connectivity[start*3:stop*3] = ids[inverse.ravel()]
+    del triangles, table_keys, table_ids
+
+    points = np.concatenate(points) if points else np.empty((0, 3), dtype=np.float32)
+    return triangle_mesh(points, connectivity_ids)
+
+
+## PLY
+def read_ply_header(f):
+    if f.readline().strip() != b'ply':
+        return None, None
+    file_format = None
+    elements = []
+    while True:
+        line = f.readline()
+        if not line:
+            return None, None
+        words = line.decode('ascii').split()
+        if not words or words[0] in ('comment', 'obj_info'):
+            continue
+        if words[0] == 'end_header':
+            break
+        if words[0] == 'format':
+            file_format = words[1]
+        elif words[0] == 'element':
+            elements.append({'name': words[1], 'count': int(words[2]),
+                             'properties': []})
+        elif words[0] == 'property':
+            elements[-1]['properties'].append(words[1:])
+    return file_format, elements
+
+def read_ply(path):
+    """Reads a binary, triangle-only PLY file through a memory map
+
+    Returns None for ASCII files and layouts the memory-mapped reader does
+    not handle, e.g. polygons with more than three vertices.
+    """
+    with open(path, 'rb') as f:
+        file_format, elements = read_ply_header(f)
+        data_offset = f.tell()
+    if file_format not in ('binary_little_endian', 'binary_big_endian'):
+        return None
+    order = '<' if file_format == 'binary_little_endian' else '>'
+
+    names = [element['name'] for element in elements]
+    if names[:2] != ['vertex', 'face'] and names != ['vertex']:
+        return None
+
+    vertex = elements[0]
+    if any(prop[0] == 'list' for prop in vertex['properties']):
+        return None
+    vertex_dtype = np.dtype([(prop[1], order + PLY_TYPES[prop[0]])
+                             for prop in vertex['properties']])
+    n_points = vertex['count']
+    vertex_data = np.memmap(path, dtype=vertex_dtype, mode='r',
+                            offset=data_offset, shape=(n_points,))
+
+    connectivity = np.empty(0, dtype=np.int64)
+    if len(elements) > 1:
+        face = elements[1]
+        if len(face['properties']) != 1 or face['properties'][0][0] != 'list':
+            return None
+        _, count_type, index_type, _ = face['properties'][0]
+        face_dtype = np.dtype([('count', order + PLY_TYPES[count_type]),
+                               ('indices', order + PLY_TYPES[index_type], (3,))])
+        faces = np.memmap(path, dtype=face_dtype, mode='r',
+                          offset=data_offset + n_points * vertex_dtype.itemsize,
+                          shape=(face['count'],))
+        connectivity = np.empty((face['count'], 3), dtype=np.int64)
+        for start in range(0, face['count'], CHUNK_SIZE):
+            chunk = faces[start:start+CHUNK_SIZE]
+            if np.any(chunk['count'] != 3):
+                return None
+            connectivity[start:start+CHUNK_SIZE] = chunk['indices']
+        connectivity = connectivity.ravel()
+        del faces
+
+    points = np.empty((n_points, 3), dtype=np.float32)
+    for i, axis in enumerate('xyz'):
+        for start in range(0, n_points, CHUNK_SIZE):
+            points[start:start+CHUNK_SIZE, i] = vertex_data[axis][start:start+CHUNK_SIZE]
+    mesh = triangle_mesh(points, connectivity)
+
+    # Remaining vertex properties become point data
+    grouped = {('nx', 'ny', 'nz'): 'Normals', ('red', 'green', 'blue'): 'RGB'}
+    used = {'x', 'y', 'z'}
+    for fields, name in grouped.items():
+        if all(field in vertex_dtype.names for field in fields):
+            array = np.empty((n_points, 3), dtype=vertex_dtype[fields[0]].newbyteorder('='))
+            for i, field in enumerate(fields):
+                array[:, i] = chunked_copy(vertex_data[field], array.dtype)
+            mesh.point_data[name] = array
+            used.update(fields)
+    for field in vertex_dtype.names:
+        if field not in used:
+            mesh.point_data[field] = chunked_copy(vertex_data[field],
+                                                  vertex_dtype[field].newbyteorder('='))
+    del vertex_data
+    return mesh
+
+
+## VTK XML
+def read_vtk_xml(path):
+    """Reads an uncompressed VTK XML file with raw appended data
+
+    The file's arrays are memory-mapped copy-on-write, so points and data
+    arrays are paged in from the file as VTK touches them. Returns None
+    for inline, base64 or compressed files.
+    """
+    with open(path, 'rb') as f:
+        head = b''
+        while b'<AppendedData' not in head:
+            block = f.read(CHUNK_SIZE)
+            if not block:
+                return None
+            head += block
+
+    match = re.search(rb'<AppendedData[^>]*encoding="raw"[^>]*>\s*_', head)
+    if not match:
+        return None
+    data_start = match.end()
+
+    root = ET.fromstring(head[:head.index(b'<AppendedData')] + b'</VTKFile>')
+    if 'compressor' in root.attrib:
+        return None
+    if root.get('byte_order', 'LittleEndian') != 'LittleEndian':
+        return None
+    header_type = '<u8' if root.get('header_type') == 'UInt64' else '<u4'
+    header_size = np.dtype(header_type).itemsize
+
+    data_type = root.get('type')
+    pieces = root.findall(f'./{data_type}/Piece')
+    if data_type not in ('PolyData', 'UnstructuredGrid') or len(pieces) != 1:
+        return None
+    piece = pieces[0]
+    if any(array.get('format') != 'appended' for array in piece.iter('DataArray')):
+        return None
+
+    def load(element):
+        offset = data_start + int(element.get('offset'))
+        n_bytes = int(np.fromfile(path, dtype=header_type, count=1, offset=offset)[0])
+        dtype = np.dtype('<' + VTK_XML_TYPES[element.get('type')])
+        array = np.memmap(path, dtype=dtype, mode='c', offset=offset + header_size,
+                          shape=(n_bytes // dtype.itemsize,))
+        components = int(element.get('NumberOfComponents', 1))
+        if components > 1:
+            array = array.reshape(-1, components)
+        return array
+
+    def cells(section):
+        element = piece.find(section)
+        arrays = {array.get('Name'): array for array in element.findall('DataArray')}
+        ends = load(arrays['offsets'])
+        offsets = np.empty(ends.shape[0] + 1, dtype=np.int64)
+        offsets[0] = 0
+        offsets[1:] = chunked_copy(ends, np.int64)
+        types = load(arrays['types']) if 'types' in arrays else None
+        return cell_array(offsets, load(arrays['connectivity'])), types
+
+    if data_type == 'PolyData':
+        mesh = pv.PolyData()
+        setters = {'Verts': mesh.SetVerts, 'Lines': mesh.SetLines,
+                   'Polys': mesh.SetPolys, 'Strips': mesh.SetStrips}
+        for section, setter in setters.items():
+            if int(piece.get(f'NumberOf{section}', 0)):
+                setter(cells(section)[0])
+    else:
+        mesh = pv.UnstructuredGrid()
+        cell_data, types = cells('Cells')
+        mesh.SetCells(numpy_to_vtk(np.asarray(types, dtype=np.uint8), deep=False,
+                                   array_type=vtk.VTK_UNSIGNED_CHAR), cell_data)
+
+    if int(piece.get('NumberOfPoints', 0)):
+        mesh.points = load(piece.find('Points/DataArray'))
+    for section, data in (('PointData', mesh.point_data),
+                          ('CellData', mesh.cell_data)):
+        element = piece.find(section)
+        if element is None:
+            continue
+        for array in element.findall('DataArray'):
+            data[array.get('Name')] = load(array)
+    return mesh
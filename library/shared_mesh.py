@@ -0,0 +1,301 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import secrets
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pyvista as pv
+import vtk
+from vtk.util.numpy_support import numpy_to_vtk
+
+from library import exporters
+from library.readers import cell_array
+
+
+# Manifest layout: int64 reference count, int64 JSON length, JSON
+MANIFEST_HEADER = 16
+
+ATTRIBUTES = ('Scalars', 'Normals', 'Vectors', 'TCoords')
+
+
+def attach_segment(name, untrack=True):
+    """Opens an existing shared memory segment without taking ownership
+
+    Before Python 3.13 every SharedMemory registers with the resource
+    tracker, which unlinks it when the attaching process exits and pulls
+    the mesh out from under the other processes. Processes that share the
+    publisher's tracker, i.e. the publisher and its child processes, must
+    keep the registration (untrack=False): removing it there makes the
+    tracker report the publisher's own unlink as unknown.
+    """
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        segment = SharedMemory(name=name)
+        if untrack:
+            resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+def active_attributes(data):
+    """Returns the names of the active attribute arrays of vtkDataSetAttributes"""
+    active = {}
+    for attribute in ATTRIBUTES:
+        array = getattr(data, f'Get{attribute}')()
+        if array is not None and array.GetName():
+            active[attribute] = array.GetName()
+    return active
+
+def grid_arrays(mesh):
+    """Returns the arrays of a StructuredGrid or UniformGrid to share
+
+    UniformGrid points are implicit, only the point and cell data are
+    shared.
+    """
+    arrays = {}
+    if isinstance(mesh, pv.StructuredGrid):
+        arrays['points'] = mesh.points
+    for key, data in (('point_data', mesh.point_data),
+                      ('cell_data', mesh.cell_data)):
+        for name in data.keys():
+            array = np.asarray(data[name])
+            if array.dtype != object:
+                arrays[f'{key}/{name}'] = array
+    return arrays
+
+
+class SharedMeshStore:
+    """Publishes meshes to shared memory for zero-copy use in other processes
+
+    The publishing process copies a mesh's points, cells and point/cell
+    arrays into shared memory once. Other processes attach by name and get
+    a pyvista dataset whose arrays point straight into the shared
+    segments. Pass the store to worker processes when they are created,
+    e.g. as Pool initargs, so they share its lock.
+
+    Parameters
+    ----------
+    prefix: str, optional
+        Prefix of the shared memory segment names. Defaults to one unique
+        to this process.
+
+    context: multiprocessing context, optional
+        Context of the worker processes, e.g. get_context('spawn'). The
+        lock is created from it, a lock from another start method cannot
+        be passed to the workers.
+
+    """
+    def __init__(self, prefix=None, context=None):
+        self.prefix = prefix or f'cd{os.getpid()}_'
+        self.lock = (context or multiprocessing.get_context()).Lock()
+        self.published = {}
+        self.attached = {}
+        # Stores passed to child processes share the publisher's tracker
+        self.shared_tracker = False
+
+    def __getstate__(self):
+        return {'prefix': self.prefix, 'lock': self.lock}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.published = {}
+        self.attached = {}
+        self.shared_tracker = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def manifest_name(self, name):
+        return self.prefix + hashlib.sha1(name.encode()).hexdigest()[:12]
+
+    def publish(self, name, mesh):
+        """Copies a mesh into shared memory under a name
+
+        Parameters
+        ----------
+        name: str
+
+        mesh: pv.PolyData, pv.UnstructuredGrid, pv.StructuredGrid or pv.UniformGrid
+            Other meshes are published as an UnstructuredGrid
+
+        """
+        grid = {}
+        if isinstance(mesh, (pv.UniformGrid, pv.StructuredGrid)):
+            # Grids are shared as they are, casting them to an
+            # UnstructuredGrid would add explicit points and hexahedra
+            arrays = grid_arrays(mesh)
+            grid['dimensions'] = list(mesh.dimensions)
+            if isinstance(mesh, pv.UniformGrid):
+                mesh_type = 'UniformGrid'
+                grid.update(origin=list(mesh.origin), spacing=list(mesh.spacing))
+            else:
+                mesh_type = 'StructuredGrid'
+            source = mesh
+        else:
+            buffers = exporters.mesh_buffers(mesh)
+            arrays = exporters.npz_arrays(buffers)
+            mesh_type = buffers['type']
+            source = buffers['mesh']
+
+        segments = []
+        entries = []
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            segment = SharedMemory(create=True, size=max(array.nbytes, 1),
+                                   name=self.prefix + secrets.token_hex(6))
+            np.ndarray(array.shape, array.dtype, buffer=segment.buf)[...] = array
+            segments.append(segment)
+            entries.append({'key': key, 'segment': segment.name,
+                            'dtype': array.dtype.str, 'shape': array.shape})
+
+        manifest = json.dumps({
+            'type': mesh_type, 'grid': grid, 'arrays': entries,
+            'point_active': active_attributes(source.GetPointData()),
+            'cell_active': active_attributes(source.GetCellData())}).encode()
+        header = SharedMemory(create=True, size=MANIFEST_HEADER + len(manifest),
+                              name=self.manifest_name(name))
+        counts = np.ndarray(2, np.int64, buffer=header.buf)
+        counts[:] = [0, len(manifest)]
+        header.buf[MANIFEST_HEADER:MANIFEST_HEADER + len(manifest)] = manifest
+        del counts
+
+        self.published[name] = [header] + segments
+
+    def attach(self, name):
+        """Returns a zero-copy pyvista dataset of a published mesh
+
+        Each attach adds a reference that release removes.
+
+        Returns
+        -------
+        pv.PolyData, pv.UnstructuredGrid, pv.StructuredGrid or pv.UniformGrid
+
+        """
+        if name in self.attached:
+            return self.attached[name][0]
+
+        untrack = not self.shared_tracker and name not in self.published
+        header = attach_segment(self.manifest_name(name), untrack)
+        with self.lock:
+            counts = np.ndarray(2, np.int64, buffer=header.buf)
+            counts[0] += 1
+            length = int(counts[1])
+            del counts
+        manifest = json.loads(bytes(header.buf[MANIFEST_HEADER:MANIFEST_HEADER + length]))
+
+        segments = [header]
+        arrays = {}
+        for entry in manifest['arrays']:
+            segment = attach_segment(entry['segment'], untrack)
+            segments.append(segment)
+            arrays[entry['key']] = np.ndarray(entry['shape'], np.dtype(entry['dtype']),
+                                              buffer=segment.buf)
+
+        mesh = self.build_mesh(manifest, arrays)
+        self.attached[name] = (mesh, segments)
+        return mesh
+
+    def build_mesh(self, manifest, arrays):
+        # The segments stay open while the mesh is attached, so the cells
+        # can point straight into them
+        if manifest['type'] == 'PolyData':
+            mesh = pv.PolyData()
+            setters = {'verts': mesh.SetVerts, 'lines': mesh.SetLines,
+                       'strips': mesh.SetStrips, 'polys': mesh.SetPolys}
+            for section, setter in setters.items():
+                if f'{section}_offsets' in arrays:
+                    setter(cell_array(arrays[f'{section}_offsets'],
+                                      arrays[f'{section}_connectivity'], copy=False))
+        elif manifest['type'] == 'UniformGrid':
+            mesh = pv.UniformGrid()
+            mesh.SetDimensions(*manifest['grid']['dimensions'])
+            mesh.SetOrigin(*manifest['grid']['origin'])
+            mesh.SetSpacing(*manifest['grid']['spacing'])
+        elif manifest['type'] == 'StructuredGrid':
+            mesh = pv.StructuredGrid()
+            mesh.SetDimensions(*manifest['grid']['dimensions'])
+        else:
+            mesh = pv.UnstructuredGrid()
+            types = numpy_to_vtk(arrays['celltypes'], deep=False,
+                                 array_type=vtk.VTK_UNSIGNED_CHAR)
+            mesh.SetCells(types, cell_array(arrays['cells_offsets'],
+                                            arrays['cells_connectivity'], copy=False))
+
+        if 'points' in arrays:
+            points = vtk.vtkPoints()
+            points.SetData(numpy_to_vtk(arrays['points'], deep=False))
+            mesh.SetPoints(points)
+
+        for key, data, active in (('point_data', mesh.GetPointData(), manifest['point_active']),
+                                  ('cell_data', mesh.GetCellData(), manifest['cell_active'])):
+            for array_key, array in arrays.items():
+                if not array_key.startswith(key + '/'):
+                    continue
+                vtk_array = numpy_to_vtk(array, deep=False)
+                vtk_array.SetName(array_key[len(key) + 1:])
+                data.AddArray(vtk_array)
+            for attribute, name in active.items():
+                getattr(data, f'SetActive{attribute}')(name)
+        return mesh
+
+    def refcount(self, name):
+        """Returns the number of attachments to a published mesh"""
+        header = self.published[name][0]
+        with self.lock:
+            return int(np.ndarray(1, np.int64, buffer=header.buf)[0])
+
+    def release(self, name):
+        """Detaches from a mesh
+
+        Drop every reference to the attached dataset first, the shared
+        segments cannot be closed while arrays still point into them.
+        """
+        mesh, segments = self.attached.pop(name)
+        del mesh
+        with self.lock:
+            counts = np.ndarray(1, np.int64, buffer=segments[0].buf)
+            counts[0] -= 1
+            del counts
+        for segment in segments:
+            try:
+                segment.close()
+            except BufferError:
+                # Arrays still point into the segment, it is unmapped
+                # once they are garbage collected
+                pass
+
+    def unpublish(self, name, force=False):
+        """Frees the shared memory of a published mesh
+
+        Parameters
+        ----------
+        name: str
+
+        force: bool, optional
+            Unlink even if other processes are still attached. Their
+            mappings stay valid until they release the mesh.
+
+        Returns
+        -------
+        bool
+            False if the mesh is still attached and was kept
+
+        """
+        if not force and self.refcount(name) > 0:
+            return False
+        for segment in self.published.pop(name):
+            segment.close()
+            segment.unlink()
+        return True
+
+    def close(self):
+        """Releases all attachments and unlinks all published meshes"""
+        for name in list(self.attached):
+            self.release(name)
+        for name in list(self.published):
+            self.unpublish(name, force=True)
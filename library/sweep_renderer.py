@@ -0,0 +1,155 @@
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import pyvista as pv
+
+from library import mesh_sources
+from library.plot_actors import PlotActor
+from library.shared_mesh import SharedMeshStore
+
+
+def sweep_schedule(bounds, axis=0, n_frames=120, side='max', scale=(1, 1, 1)):
+    """Creates frames that sweep one clipping plane across the mesh
+
+    Parameters
+    ----------
+    bounds: list
+        Mesh bounds [xmin, xmax, ymin, ymax, zmin, zmax]
+
+    axis: int, optional
+        0, 1, 2 for the X, Y, Z planes
+
+    n_frames: int, optional
+
+    side: str, optional
+        'max' sweeps the upper plane down to the lower bound, 'min' sweeps
+        the lower plane up to the upper bound
+
+    scale: list, optional
+        Plot scale applied to every frame
+
+    Returns
+    -------
+    list of dict
+        Frames with 'bounds' and 'scale' entries
+
+    """
+    low, high = bounds[axis*2], bounds[axis*2+1]
+    if side == 'max':
+        positions = np.linspace(high, low, n_frames + 1)[:-1]
+    else:
+        positions = np.linspace(low, high, n_frames + 1)[:-1]
+
+    frames = []
+    for position in positions:
+        frame_bounds = list(bounds)
+        frame_bounds[axis*2 + (side == 'max')] = float(position)
+        frames.append({'bounds': frame_bounds, 'scale': list(scale)})
+    return frames
+
+def load_schedule(path):
+    """Loads a sweep schedule from a JSON list of {"bounds", "scale"} frames"""
+    with open(path) as f:
+        return json.load(f)
+
+
+# Per-process renderer state, created by init_worker
+worker = {}
+
+def init_worker(name, path, window_size, out_dir, store=None):
+    if store is not None:
+        mesh = store.attach(name)
+    else:
+        registry = mesh_sources.builtin_registry()
+        if path:
+            registry.register_file(path, name)
+        mesh = registry.load(name)
+
+    plotter = pv.Plotter(off_screen=True, window_size=list(window_size))
+    plotActor = PlotActor(plotter)
+    plotActor.load_original(mesh)
+
+    # Every worker frames the full mesh the same way
+    plotActor.show(plotActor.original, reset_camera=True)
+    worker.update(plotter=plotter, plotActor=plotActor, out_dir=out_dir,
+                  camera=plotter.camera_position)
+
+def render_frame(task):
+    index, frame = task
+    plotter = worker['plotter']
+    plotActor = worker['plotActor']
+
+    plotActor.show(plotActor.clip(frame['bounds']), reset_camera=False)
+    plotter.set_scale(*frame.get('scale', (1, 1, 1)), reset_camera=False)
+    plotter.camera_position = worker['camera']
+
+    path = os.path.join(worker['out_dir'], f'frame_{index:05d}.png')
+    plotter.screenshot(path)
+    return index
+
+def render_sweep(name, frames, out_dir, workers=None, path=None,
+                 window_size=(1280, 720), mesh=None):
+    """Renders a clipping sweep to an ordered PNG sequence off-screen
+
+    Frames are split across a pool of processes that each load the mesh
+    once into their own off-screen plotter. If the mesh is passed in, it
+    is published to shared memory once and the workers attach to it
+    instead of loading their own copies.
+
+    Parameters
+    ----------
+    name: str
+        Mesh source name, e.g. 'Brain'
+
+    frames: list of dict
+        Sweep schedule, see sweep_schedule
+
+    out_dir: str
+        Directory the frame_00000.png, ... sequence is written to
+
+    workers: int, optional
+        Number of processes. Defaults to the number of cores.
+
+    path: str, optional
+        Mesh file to register under name
+
+    window_size: list, optional
+
+    mesh: pv.DataSet, optional
+        Already loaded mesh to share with the workers
+
+    Returns
+    -------
+    dict
+        Frame count, worker count, elapsed seconds including worker
+        start-up, and frames per second
+
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+
+    # Spawned processes get fresh VTK and OpenGL state
+    context = multiprocessing.get_context('spawn')
+    store = None
+    if mesh is not None:
+        # Normals computed before publishing are shared with every worker
+        PlotActor(None).load_original(mesh)
+        store = SharedMeshStore(context=context)
+        store.publish(name, mesh)
+
+    start = time.perf_counter()
+    try:
+        with context.Pool(workers, init_worker,
+                          (name, path, window_size, out_dir, store)) as pool:
+            for _ in pool.imap_unordered(render_frame, enumerate(frames)):
+                pass
+    finally:
+        if store is not None:
+            store.close()
+    end = time.perf_counter()
+
+    return {'frames': len(frames), 'workers': workers,
+            'seconds': end - start, 'fps': len(frames) / (end - start)}
@@ -0,0 +1,176 @@
+import numpy as np
+import pyvista as pv
+from vtk.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+
+from library.readers import cell_array
+from library.shared_mesh import active_attributes
+
+
+def triangle_surface(mesh):
+    """Returns an all-triangle PolyData surface of a mesh
+
+    Returns None for meshes whose surface does not hold all of their
+    points, e.g. volumes, which the triangle backend cannot clip.
+    """
+    if isinstance(mesh, pv.PolyData):
+        surface = mesh
+    else:
+        surface = mesh.extract_surface(pass_pointid=False, pass_cellid=False)
+        if surface.n_points != mesh.n_points:
+            return None
+    surface = surface.triangulate()
+    if surface.GetVerts().GetNumberOfCells() or surface.GetLines().GetNumberOfCells():
+        return None
+    return surface
+
+def clip_polygons(bary, count, distance):
+    """Clips convex polygons against one plane (Sutherland-Hodgman)
+
+    Parameters
+    ----------
+    bary: (M, K, 3) array
+        Barycentric coordinates of each polygon vertex in its triangle
+
+    count: (M,) array
+        Number of vertices of each polygon
+
+    distance: (M, K) array
+        Signed distance of each vertex to the plane, >= 0 inside
+
+    Returns
+    -------
+    bary, count
+        The clipped polygons
+
+    """
+    m, k, _ = bary.shape
+    index = np.arange(k)[None, :]
+    valid = index < count[:, None]
+    following = (index + 1) % np.maximum(count, 1)[:, None]
+
+    next_distance = np.take_along_axis(distance, following, axis=1)
+    next_bary = np.take_along_axis(bary, following[..., None], axis=1)
+    inside = distance >= 0
+    next_inside = next_distance >= 0
+
+    # Each edge emits its start vertex if inside, and its crossing point
+    # if it crosses the plane
+    emit_vertex = valid & inside
+    emit_crossing = valid & (inside != next_inside)
+    t = np.divide(distance, distance - next_distance, out=np.zeros_like(distance),
+                  where=emit_crossing)
+    crossing = bary + t[..., None] * (next_bary - bary)
+
+    candidates = np.stack([bary, crossing], axis=2).reshape(m, 2 * k, 3)
+    emitted = np.stack([emit_vertex, emit_crossing], axis=2).reshape(m, 2 * k)
+    new_count = emitted.sum(axis=1)
+    width = max(int(new_count.max(initial=0)), 3)
+    order = np.argsort(~emitted, axis=1, kind='stable')[:, :width]
+    return np.take_along_axis(candidates, order[..., None], axis=1), new_count
+
+def interpolate(array, triangles, bary):
+    """Interpolates per-point values at barycentric positions"""
+    if triangles.shape[0] == 0:
+        # Nothing was cut, e.g. the box holds or misses the whole mesh
+        return np.empty((0, bary.shape[1]) + array.shape[1:], dtype=array.dtype)
+    values = array[triangles]
+    shape = values.shape
+    values = values.reshape(shape[0], 3, -1).astype(np.float64)
+    result = np.einsum('mkj,mjc->mkc', bary, values)
+    if np.issubdtype(array.dtype, np.integer):
+        result = np.rint(result)
+    return result.reshape(shape[0], bary.shape[1], *shape[2:]).astype(array.dtype)
+
+def clip_triangles(surface, bounds):
+    """Clips a triangle surface to an axis-aligned box with NumPy
+
+    Vertices are classified against the six planes in one batch.
+    Triangles entirely inside are kept as they are, triangles entirely
+    beyond one plane are dropped, and only the crossing triangles are
+    clipped, all at once, plane by plane. Point data is interpolated at
+    the new vertices. New vertices are not shared between neighbouring
+    triangles.
+
+    Parameters
+    ----------
+    surface: pv.PolyData
+        All-triangle surface, see triangle_surface
+
+    bounds: list
+        [xmin, xmax, ymin, ymax, zmin, zmax]
+
+    Returns
+    -------
+    pv.PolyData
+
+    """
+    points = np.asarray(surface.points)
+    triangles = vtk_to_numpy(surface.GetPolys().GetConnectivityArray()).reshape(-1, 3)
+    low = np.asarray(bounds[0::2], dtype=points.dtype)
+    high = np.asarray(bounds[1::2], dtype=points.dtype)
+
+    # Outcodes: one bit per plane a vertex lies beyond
+    bits = 1 << np.arange(6, dtype=np.uint8)
+    outside = np.concatenate([points < low, points > high], axis=1)
+    codes = (outside * bits).sum(axis=1).astype(np.uint8)
+    triangle_codes = codes[triangles]
+    inner = (triangle_codes == 0).all(axis=1)
+    rejected = (triangle_codes[:, 0] & triangle_codes[:, 1] & triangle_codes[:, 2]) != 0
+    cut_ids = np.nonzero(~inner & ~rejected)[0]
+    inner_ids = np.nonzero(inner)[0]
+
+    # Clip the crossing triangles as polygons in barycentric coordinates
+    corners = points[triangles[cut_ids]].astype(np.float64)
+    bary = np.zeros((cut_ids.shape[0], 3, 3))
+    bary[:, [0, 1, 2], [0, 1, 2]] = 1
+    count = np.full(cut_ids.shape[0], 3)
+    for axis in range(3):
+        for sign, limit in ((1, low[axis]), (-1, high[axis])):
+            coordinate = np.einsum('mkj,mj->mk', bary, corners[:, :, axis])
+            bary, count = clip_polygons(bary, count, sign * (coordinate - limit))
+            keep = count >= 3
+            bary, count = bary[keep], count[keep]
+            corners, cut_ids = corners[keep], cut_ids[keep]
+
+    # Output points: used original points, then the clipped polygon vertices
+    kept = triangles[inner_ids]
+    used, inner_connectivity = np.unique(kept, return_inverse=True)
+    valid = np.arange(bary.shape[1])[None, :] < count[:, None]
+    new_points = np.einsum('mkj,mjd->mkd', bary, corners)[valid]
+    clipped_points = np.concatenate([points[used], new_points.astype(points.dtype)])
+
+    # Fan-triangulate the clipped polygons
+    starts = used.shape[0] + np.cumsum(count) - count
+    fans, fan_cells = [], []
+    for j in range(1, bary.shape[1] - 1):
+        rows = np.nonzero(count > j + 1)[0]
+        fans.append(np.stack([starts[rows], starts[rows] + j,
+                              starts[rows] + j + 1], axis=1))
+        fan_cells.append(cut_ids[rows])
+    connectivity = np.concatenate([inner_connectivity.reshape(-1, 3)] + fans).ravel()
+    source_cells = np.concatenate([inner_ids] + fan_cells)
+
+    clipped = pv.PolyData()
+    clipped.points = clipped_points
+    offsets = np.arange(0, connectivity.shape[0] + 1, 3, dtype=np.int64)
+    clipped.SetPolys(cell_array(offsets, connectivity.astype(np.int64)))
+
+    # Point and cell arrays, keeping the active normals and scalars
+    source_triangles = triangles[cut_ids]
+    for data, output, select in (
+            (surface.GetPointData(), clipped.GetPointData(),
+             lambda array: np.concatenate([array[used],
+                                           interpolate(array, source_triangles, bary)[valid]])),
+            (surface.GetCellData(), clipped.GetCellData(),
+             lambda array: array[source_cells])):
+        for i in range(data.GetNumberOfArrays()):
+            source = data.GetArray(i)
+            if source is None or not source.GetName():
+                continue
+            array = numpy_to_vtk(np.ascontiguousarray(select(vtk_to_numpy(source))),
+                                 deep=True)
+            array.SetName(source.GetName())
+            output.AddArray(array)
+        for attribute, name in active_attributes(data).items():
+            getattr(output, f'SetActive{attribute}')(name)
+    return clipped
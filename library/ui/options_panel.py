@@ -1,14 +1,15 @@
 from PyQt5.QtWidgets import (QGroupBox, QVBoxLayout, QHBoxLayout, 
                              QWidget, QCheckBox, QPushButton, QLabel,
-                             QRadioButton)
-from PyQt5.QtCore import Qt, pyqtSlot
+                             QRadioButton, QFileDialog, QListWidget)
+from PyQt5.QtCore import Qt, pyqtSlot, pyqtSignal
 
 import pyvista as pv
 
 from library import plot_actors
 from library.ui import qt_objects as QtO
 from library.ui.slider_widgets import DoubleSliderWidget, SliderWidget
-from library import helpers
+from library import mesh_sources
+from library.clip_regions import BoxRegion, HalfSpaceRegion
                              
 ## Bottom (HBox)
 # Left: Generate new grid
@@ -16,70 +17,80 @@ from library import helpers
 # Right: Scaling
 
 class MeshRendering(QWidget):
-    def __init__(self, plotter, plotActor):
+    def __init__(self, plotter, plotActor, registry=None):
         super().__init__()
         self.plotter = plotter
         self.plotActor = plotActor
+        self.registry = registry or mesh_sources.builtin_registry()
         self.slicers = []
         
-        layout = QVBoxLayout(self)
+        self.meshLayout = QVBoxLayout(self)
         
         # Mesh Visualization
         meshTitle = QLabel("<b>Mesh Rendering")
         self.noMesh = QtO.new_radio('None', self.toggle_mesh, checked=True)
-        self.tubeMesh = QtO.new_radio('Tube', self.toggle_mesh)
-        self.gridMesh = QtO.new_radio('Grid', self.toggle_mesh)
-        self.footMesh = QtO.new_radio('Foot Bones', self.toggle_mesh)
-        self.stHelensMesh = QtO.new_radio("Mount St. Helens", self.toggle_mesh)
-        self.brainMesh = QtO.new_radio("Brain", self.toggle_mesh)
-        self.laurentMesh = QtO.new_radio("Laurent Lattice", self.toggle_mesh)
+        self.meshRadios = [self.new_mesh_radio(source) 
+                           for source in self.registry]
+        self.openFile = QtO.new_pushbutton('Open File...', self.open_file)
         
         # Plotter Options
         plotterTitle = QLabel("<b>Plotter Options")
         self.showGrid = QtO.new_checkbox('Show Grid', self.toggle_grid)
         self.showBounds = QtO.new_checkbox('Show Bounds', self.toggle_bounds)
         
-        items = [meshTitle, self.noMesh, self.tubeMesh, self.gridMesh, 
-                 self.stHelensMesh, self.footMesh, self.stHelensMesh,
-                 self.brainMesh, self.laurentMesh, 5,
-                 plotterTitle, self.showGrid, self.showBounds]
-        QtO.add_widgets(layout, items)
+        items = ([meshTitle, self.noMesh] + self.meshRadios + 
+                 [self.openFile, 5, plotterTitle, 
+                  self.showGrid, self.showBounds])
+        QtO.add_widgets(self.meshLayout, items)
+        
+    def new_mesh_radio(self, source):
+        radio = QtO.new_radio(source.name, self.toggle_mesh)
+        radio.setToolTip(source.description())
+        return radio
         
     # Mesh Options
+    def open_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Open Mesh', '',
+                                              'Meshes (*.vtp *.vtu *.vtk *.vti '
+                                              '*.vts *.stl *.ply *.obj);;'
+                                              'All Files (*)')
+        if not path:
+            return
+        
+        source = self.registry.register_file(path)
+        radio = self.new_mesh_radio(source)
+        index = self.meshLayout.indexOf(self.openFile)
+        self.meshLayout.insertWidget(index, radio, alignment=Qt.AlignCenter)
+        self.meshRadios.append(radio)
+        radio.setChecked(True)
+    
     @pyqtSlot()
     def toggle_mesh(self):
         if not self.sender().isChecked():
             return
+        name = self.sender().text()
+        source = self.registry[name] if name in self.registry else None
+        self.plotActor.record('mesh', name=name,
+                              path=source.path if source else None)
         
-        # Clear the actor 
+        # Clear the actor and release the previous mesh before loading
         self.plotter.reset_camera()
         self.plotter.remove_actor(self.plotActor.clipped)
-        self.toggle_plotter_options(self.noMesh.isChecked()) # Toggle options
+        self.plotActor.reset()
+        self.toggle_plotter_options(source is None) # Toggle options
         
-        if self.noMesh.isChecked():
-            self.plotActor.reset() # Reset the actor
+        if source is None:
             return
         
-        # Add new mesh to the actor
-        if self.tubeMesh.isChecked():
-            self.plotActor.original = helpers.load_tube()
-        elif self.gridMesh.isChecked():
-            self.plotActor.original = helpers.load_grid()
-        elif self.footMesh.isChecked():
-            self.plotActor.original = helpers.load_foot()
-        elif self.stHelensMesh.isChecked():
-            self.plotActor.original = helpers.load_st_helens()
-        elif self.brainMesh.isChecked():
-            self.plotActor.original = helpers.load_brain()
-        elif self.laurentMesh.isChecked():
-            self.plotActor.original = helpers.load_Laurent_lattice()
+        with self.plotActor.monitor.track(f'load {name}',
+                                          self.plotActor.datasets,
+                                          source.estimated_size):
+            # Add new mesh to the actor
+            self.plotActor.load_original(source.load())
             
-        
-        # Add new actor to the scene
-        if self.plotActor.original:
-            self.plotActor.clipped = self.plotter.add_mesh(self.plotActor.original,
-                                                        smooth_shading=True,
-                                                        show_scalar_bar=False)
+            # Add new actor to the scene
+            if self.plotActor.original:
+                self.plotActor.show(self.plotActor.original, reset_camera=None)
         
         self.update_clip_bounds(self.plotActor.original.bounds)
         return
@@ -118,6 +129,10 @@ class MeshRendering(QWidget):
 
 
 class SlicingControl(QWidget):
+    # Byte counts of large exports overflow a 32-bit int
+    exportProgress = pyqtSignal('qint64', 'qint64')
+    exportFinished = pyqtSignal(str)
+    
     def __init__(self, plotter, plotActor):
         super().__init__()
         self.plotter = plotter
@@ -130,6 +145,16 @@ class SlicingControl(QWidget):
         
         self.clipRealTime = QtO.new_checkbox('Real-time Clipping', 
                                             self.toggle_realtime)
+        self.crossSections = QtO.new_checkbox('Cross-section Mode',
+                                              self.toggle_cross_sections)
+        self.crossSections.setToolTip('Show X/Y/Z cross-sections at the '
+                                      'center of each clipping range')
+        self.numpyBackend = QtO.new_checkbox('NumPy Surface Clipping',
+                                             self.toggle_backend)
+        self.numpyBackend.setToolTip('Clip triangle surfaces with vectorized '
+                                     'NumPy instead of the VTK filter')
+        self.dragBox = QtO.new_checkbox('Drag Clipping Box', self.toggle_dragging)
+        self.dragBox.setToolTip('Move and resize the clipping box in the view')
         
         self.xClipWidget = DoubleSliderWidget('X Plane: ', self.boxWidget,
                                               self.update_slicing_box_position)
@@ -139,6 +164,11 @@ class SlicingControl(QWidget):
                                               self.update_slicing_box_position)
         
         self.slicers = [self.xClipWidget, self.yClipWidget, self.zClipWidget]
+        self.boxWidget.bounds_changed = self.sync_slicers
+        
+        # Placed in its own panel column by the OptionsPanel
+        self.regionControl = RegionControl(self.plotter, self.plotActor,
+                                           self.boxWidget, self.current_bounds)
 
         self.resetClip = QPushButton("Reset Clipping")
         QtO.connect_button(self.resetClip, [self.xClipWidget.reset_values,
@@ -146,46 +176,198 @@ class SlicingControl(QWidget):
                                             self.zClipWidget.reset_values,
                                             self.reset_clipping])
         
-        middle_widgets = [clippingLabel, self.clipRealTime,
+        # Export
+        self.exportClip = QtO.new_pushbutton("Export Clip...", self.export_clip)
+        self.compressExport = QtO.new_checkbox('Compress Export', lambda: None)
+        self.exportStatus = QLabel()
+        self.exportProgress.connect(self.update_export_progress)
+        self.exportFinished.connect(self.exportStatus.setText)
+        
+        middle_widgets = [clippingLabel, self.clipRealTime, self.crossSections,
+                          self.numpyBackend, self.dragBox,
                           self.xClipWidget, self.yClipWidget, 
-                          self.zClipWidget, self.resetClip]
+                          self.zClipWidget, self.resetClip, 
+                          self.exportClip, self.compressExport,
+                          self.exportStatus]
         QtO.add_widgets(middleLayout, middle_widgets)
         
     def toggle_slicers(self, locked):
         for slicer in self.slicers:
             slicer.setDisabled(locked)
+        self.exportClip.setDisabled(locked)
+        self.regionControl.setDisabled(locked)
             
     def toggle_realtime(self):
         self.boxWidget.realtime_clipping = self.clipRealTime.isChecked()
+        self.plotActor.record('realtime', enabled=self.clipRealTime.isChecked())
        
+    def toggle_backend(self):
+        backend = 'numpy' if self.numpyBackend.isChecked() else 'vtk'
+        self.plotActor.clip_backend = backend
+        self.plotActor.record('backend', backend=backend)
+        
+    def toggle_dragging(self):
+        self.boxWidget.toggle_dragging(self.dragBox.isChecked())
+        
+    def toggle_cross_sections(self):
+        self.boxWidget.bounds = self.current_bounds()
+        self.boxWidget.toggle_cross_sections(self.crossSections.isChecked())
+        
     def reset_clipping(self):
         self.boxWidget.reset_mesh_clip()
         return
     
+    def export_clip(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Export Clip', '',
+                                              'VTK XML (*.vtu *.vtp);;'
+                                              'NumPy Archive (*.npz)')
+        if not path:
+            return
+        
+        # Progress and results arrive on the export thread, the signals
+        # hand them to the GUI thread
+        future = self.boxWidget.export_clip(path, 
+                                            self.compressExport.isChecked(),
+                                            self.exportProgress.emit)
+        future.add_done_callback(self.export_done)
+    
+    def update_export_progress(self, written, total):
+        percent = written / total * 100 if total else 100
+        self.exportStatus.setText(f"Exporting... {percent:.0f}%")
+    
+    def export_done(self, future):
+        if future.exception():
+            self.exportFinished.emit(f"Export failed: {future.exception()}")
+            return
+        stats = future.result()
+        self.exportFinished.emit(f"Exported {stats['bytes'] / 1024**2:.1f} MB "
+                                 f"at {stats['mb_per_s']:.0f} MB/s")
+    
     def update_clip_ranges(self, bounds):
         self.xClipWidget.update_minmax(bounds[0], bounds[1])
         self.yClipWidget.update_minmax(bounds[2], bounds[3])
         self.zClipWidget.update_minmax(bounds[4], bounds[5])
+        self.regionControl.refresh()
+        if self.crossSections.isChecked():
+            self.toggle_cross_sections()
         
-    def update_slicing_box_position(self):
+    def current_bounds(self):
         xmin, xmax = self.xClipWidget.return_value()
         ymin, ymax = self.yClipWidget.return_value()
         zmin, zmax = self.zClipWidget.return_value()
-        bounds = [xmin, xmax, ymin, ymax, zmin, zmax]
-        self.boxWidget.update_position(bounds)
+        return [xmin, xmax, ymin, ymax, zmin, zmax]
+        
+    def sync_slicers(self, bounds):
+        """Moves the slicers to the bounds of a dragged box"""
+        for axis, slicer in enumerate(self.slicers):
+            slicer.set_values(bounds[axis*2], bounds[axis*2+1])
+    
+    def update_slicing_box_position(self):
+        self.boxWidget.update_position(self.current_bounds())
+
+
+class RegionControl(QWidget):
+    def __init__(self, plotter, plotActor, boxWidget, current_bounds):
+        super().__init__()
+        self.plotter = plotter
+        self.plotActor = plotActor
+        self.boxWidget = boxWidget
+        self.current_bounds = current_bounds
+        
+        layout = QVBoxLayout(self)
+        layout.setSpacing(0)
+        regionLabel = QLabel("<b>Clip Regions")
+        
+        self.regionList = QListWidget()
+        self.regionList.setFixedSize(220, 80)
+        
+        self.addBox = QtO.new_pushbutton("Add Box", self.add_box)
+        self.addCutaway = QtO.new_pushbutton("Add Cutaway", self.add_cutaway)
+        self.addPlane = QtO.new_pushbutton("Add View Plane", self.add_plane)
+        self.removeRegion = QtO.new_pushbutton("Remove Region", 
+                                               self.remove_region)
+        
+        self.unionMode = QtO.new_radio('Union', self.toggle_mode, checked=True)
+        self.intersectionMode = QtO.new_radio('Intersection', self.toggle_mode)
+        
+        buttons = QWidget()
+        buttonLayout = QHBoxLayout(buttons)
+        QtO.add_widgets(buttonLayout, [self.addBox, self.addCutaway])
+        modes = QWidget()
+        modeLayout = QHBoxLayout(modes)
+        QtO.add_widgets(modeLayout, [self.unionMode, self.intersectionMode])
+        
+        QtO.add_widgets(layout, [regionLabel, self.regionList, buttons,
+                                 self.addPlane, self.removeRegion, modes])
+    
+    def add_box(self):
+        self.add_region(BoxRegion(self.current_bounds()))
+        
+    def add_cutaway(self):
+        self.add_region(BoxRegion(self.current_bounds(), invert=True))
+        
+    def add_plane(self):
+        # Plane through the box center facing away from the camera, so the
+        # half of the mesh nearest to the viewer is cut away
+        bounds = self.current_bounds()
+        center = [(bounds[i] + bounds[i+1]) / 2 for i in (0, 2, 4)]
+        self.add_region(HalfSpaceRegion(center, self.plotter.camera.direction))
+    
+    def add_region(self, region):
+        self.plotActor.regions.append(region)
+        self.update_regions()
+        
+    def remove_region(self):
+        row = self.regionList.currentRow()
+        if row < 0:
+            return
+        del self.plotActor.regions[row]
+        self.update_regions()
+    
+    def toggle_mode(self):
+        if not self.sender().isChecked():
+            return
+        self.plotActor.region_mode = ('union' if self.unionMode.isChecked() 
+                                      else 'intersection')
+        self.update_regions()
+        
+    def update_regions(self):
+        self.refresh()
+        self.plotActor.record('regions', mode=self.plotActor.region_mode,
+                              regions=[region.to_dict() 
+                                       for region in self.plotActor.regions])
+        if self.plotActor.original is not None:
+            self.boxWidget.bounds = self.current_bounds()
+            self.boxWidget.update_mesh_clip()
+            
+    def refresh(self):
+        self.regionList.clear()
+        for region in self.plotActor.regions:
+            self.regionList.addItem(region.description())
+        
+        for radio in [self.unionMode, self.intersectionMode]:
+            radio.blockSignals(True)
+        self.unionMode.setChecked(self.plotActor.region_mode == 'union')
+        self.intersectionMode.setChecked(self.plotActor.region_mode != 'union')
+        for radio in [self.unionMode, self.intersectionMode]:
+            radio.blockSignals(False)
         
 
 class ScalingControl(QWidget):
-    def __init__(self, plotter):
+    def __init__(self, plotter, plotActor):
         super().__init__()
         self.plotter = plotter
+        self.plotActor = plotActor
         rightLayout = QVBoxLayout(self)
         rightLayout.setSpacing(0)
         scalingLabel = QLabel("<b>Plot Scaling")
         
-        self.xScalingWidget = SliderWidget("X Scale: ", self.plotter, 0)
-        self.yScalingWidget = SliderWidget("Y Scale: ", self.plotter, 1)
-        self.zScalingWidget = SliderWidget("Z Scale: ", self.plotter, 2)
+        self.xScalingWidget = SliderWidget("X Scale: ", self.plotter,
+                                           self.plotActor, 0)
+        self.yScalingWidget = SliderWidget("Y Scale: ", self.plotter,
+                                           self.plotActor, 1)
+        self.zScalingWidget = SliderWidget("Z Scale: ", self.plotter,
+                                           self.plotActor, 2)
         
         self.resetScale = QPushButton("Reset Scale")
         QtO.connect_button(self.resetScale, [self.xScalingWidget.reset_values,
@@ -216,10 +398,12 @@ class OptionsPanel(QGroupBox):
         leftWidget.toggle_plotter_options(True)
 
         ### Right Pannel - Plotter Scaling ###
-        rightWidget = ScalingControl(self.plotter)
+        rightWidget = ScalingControl(self.plotter, self.plotActor)
         
         panel_widgets = [0, leftWidget, QtO.dividing_line('vertical', 2),
                          middleWidget, QtO.dividing_line('vertical', 2),
+                         middleWidget.regionControl, 
+                         QtO.dividing_line('vertical', 2),
                          rightWidget, 0]
         QtO.add_widgets(self.panelLayout, panel_widgets)
         return
\ No newline at end of file
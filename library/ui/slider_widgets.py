@@ -10,10 +10,11 @@ from library.ui import qt_objects as QtO
 
 
 class SliderWidget(QWidget):
-    def __init__(self, header_text, plotter, axis=0):
+    def __init__(self, header_text, plotter, plotActor, axis=0):
         super().__init__()
         self.axis = axis
         self.plotter = plotter
+        self.plotActor = plotActor
         
         # Widget Layout
         layout = QHBoxLayout(self)
@@ -50,6 +51,7 @@ class SliderWidget(QWidget):
     def update_plotter_scale(self):
         current_scale = self.plotter.scale
         current_scale[self.axis] = self.spin.value()
+        self.plotActor.record('scale', axis=self.axis, value=self.spin.value())
         self.plotter.set_scale()
         self.plotter.update()
 
@@ -162,6 +164,13 @@ class DoubleSliderWidget(QWidget):
         self.toggle_blocks(False)
         return
     
+    def set_values(self, min_val, max_val):
+        """Moves the spins and slider to a range without clipping"""
+        self.toggle_blocks(True)
+        self.leftSpin.setValue(min_val)
+        self.rightSpin.setValue(max_val)
+        self.box_update()
+    
     def reset_values(self):
         self.toggle_blocks(True)
         self.slider.setValue((self.slider.minimum(), self.slider.maximum()))
@@ -0,0 +1,51 @@
+"""Renders a clipping sweep of a mesh to a PNG sequence off-screen
+
+Examples:
+    python render_sweep.py Brain --axis 2 --frames 240 --out frames
+    python render_sweep.py mesh --file scan.vtu --schedule sweep.json
+    python render_sweep.py Brain --scaling 1 2 4 8
+"""
+import argparse
+
+from library import mesh_sources
+from library.sweep_renderer import load_schedule, render_sweep, sweep_schedule
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('mesh', help='Mesh source name, e.g. Brain')
+    parser.add_argument('--file', help='Mesh file to register under the name')
+    parser.add_argument('--axis', type=int, default=0, choices=(0, 1, 2))
+    parser.add_argument('--side', default='max', choices=('min', 'max'))
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--scale', type=float, nargs=3, default=(1, 1, 1))
+    parser.add_argument('--schedule', help='JSON list of {"bounds", "scale"} frames')
+    parser.add_argument('--out', default='sweep_frames')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--size', type=int, nargs=2, default=(1280, 720))
+    parser.add_argument('--scaling', type=int, nargs='+', metavar='WORKERS',
+                        help='Render once per worker count and compare')
+    parser.add_argument('--shared', action='store_true',
+                        help='Load the mesh once and share it with the '
+                             'workers through shared memory')
+    args = parser.parse_args()
+
+    mesh = None
+    if args.shared or not args.schedule:
+        registry = mesh_sources.builtin_registry()
+        if args.file:
+            registry.register_file(args.file, args.mesh)
+        mesh = registry.load(args.mesh)
+
+    if args.schedule:
+        frames = load_schedule(args.schedule)
+    else:
+        frames = sweep_schedule(mesh.bounds, args.axis, args.frames, args.side,
+                                args.scale)
+
+    for workers in args.scaling or [args.workers]:
+        stats = render_sweep(args.mesh, frames, args.out, workers, args.file,
+                             args.size, mesh if args.shared else None)
+        print(f"{stats['frames']} frames, {stats['workers']} workers: "
+              f"{stats['seconds']:.2f} s, {stats['fps']:.1f} frames/s")
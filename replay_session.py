@@ -0,0 +1,32 @@
+"""Replays a recorded clip_app session off-screen and reports event latency
+
+Record a session with:
+    python clip_app.py --record session.jsonl
+then replay it with:
+    python replay_session.py session.jsonl
+"""
+import argparse
+
+from library.interaction_log import SessionPlayer, load_session
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('session', help='Session file written by --record')
+    parser.add_argument('--frame-time', type=float, default=1000/60,
+                        help='Frame budget in ms used to count dropped frames')
+    parser.add_argument('--paced', action='store_true',
+                        help='Replay events at their recorded times')
+    args = parser.parse_args()
+
+    player = SessionPlayer(frame_time=args.frame_time / 1000)
+    latencies = player.play(load_session(args.session), paced=args.paced)
+    summary = player.report(latencies)
+    player.close()
+
+    print(f"{'event':>12} {'count':>6} {'p50':>8} {'p90':>8} {'p99':>8} "
+          f"{'max':>8} {'dropped':>8}")
+    for name, stats in summary.items():
+        print(f"{name:>12} {stats['count']:>6} {stats['p50']:>8.1f} "
+              f"{stats['p90']:>8.1f} {stats['p99']:>8.1f} {stats['max']:>8.1f} "
+              f"{stats['dropped_frames']:>8}")
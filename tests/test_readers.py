@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import pyvista as pv
+
+from library import exporters, readers
+
+
+def sphere():
+    mesh = pv.Sphere(theta_resolution=30, phi_resolution=30)
+    mesh.point_data['height'] = np.asarray(mesh.points)[:, 2].copy()
+    return mesh
+
+def sorted_centers(mesh):
+    centers = np.asarray(mesh.cell_centers().points)
+    return centers[np.lexsort(centers.T)]
+
+def assert_same_surface(mesh, expected):
+    assert mesh.n_cells == expected.n_cells
+    assert mesh.n_points == expected.n_points
+    np.testing.assert_allclose(mesh.bounds, expected.bounds, atol=1e-6)
+    assert mesh.extract_surface().area == pytest.approx(expected.extract_surface().area)
+    np.testing.assert_allclose(sorted_centers(mesh), sorted_centers(expected),
+                               atol=1e-6)
+
+@pytest.mark.parametrize('chunk_size', [7, readers.CHUNK_SIZE])
+def test_stl_matches_pv_read(tmp_path, monkeypatch, chunk_size):
+    path = str(tmp_path / 'sphere.stl')
+    sphere().save(path, binary=True)
+    monkeypatch.setattr(readers, 'CHUNK_SIZE', chunk_size)
+
+    mesh = readers.read_mesh(path)
+    assert isinstance(mesh, pv.PolyData)
+    assert_same_surface(mesh, pv.read(path))
+
+def test_ply_matches_pv_read(tmp_path):
+    path = str(tmp_path / 'sphere.ply')
+    sphere().save(path, binary=True)
+
+    mesh = readers.read_ply(path)
+    assert mesh is not None
+    expected = pv.read(path)
+    assert_same_surface(mesh, expected)
+    np.testing.assert_array_equal(mesh.points, expected.points)
+    np.testing.assert_array_equal(mesh.faces, expected.faces)
+
+@pytest.mark.parametrize('extension', ['.vtp', '.vtu'])
+def test_vtk_xml_matches_pv_read(tmp_path, extension):
+    source = sphere()
+    if extension == '.vtu':
+        source = source.cast_to_unstructured_grid()
+    path, = exporters.export_meshes([str(tmp_path / f'sphere{extension}')],
+                                    [source])['paths']
+
+    mesh = readers.read_vtk_xml(path)
+    assert mesh is not None
+    expected = pv.read(path)
+    assert type(mesh) is type(expected)
+    assert_same_surface(mesh, expected)
+    np.testing.assert_array_equal(mesh.points, expected.points)
+    np.testing.assert_array_equal(mesh.point_data['height'],
+                                  expected.point_data['height'])
+    if extension == '.vtu':
+        np.testing.assert_array_equal(mesh.cells, expected.cells)
+        np.testing.assert_array_equal(mesh.celltypes, expected.celltypes)
+    else:
+        np.testing.assert_array_equal(mesh.faces, expected.faces)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import pyvista as pv
+
+from library.triangle_clip import clip_triangles, triangle_surface
+
+
+BOXES = [[-0.3, 0.2, -0.5, 0.5, -0.1, 0.4],
+         [0.0, 1.0, -1.0, 0.0, -1.0, 1.0],
+         [-0.45, 0.45, -0.45, 0.45, -0.45, 0.45]]
+
+def linear_field(points):
+    return points[:, 0] + 2 * points[:, 1] - points[:, 2]
+
+def cell_areas(mesh):
+    sizes = mesh.compute_cell_sizes(length=False, area=True, volume=False)
+    return np.asarray(sizes.cell_data['Area'])
+
+@pytest.fixture(params=['sphere', 'plane'])
+def surface(request):
+    if request.param == 'sphere':
+        mesh = pv.Sphere(theta_resolution=40, phi_resolution=40)
+    else:
+        mesh = pv.Plane(i_resolution=30, j_resolution=30).rotate_x(30, inplace=False)
+    mesh.point_data['field'] = linear_field(mesh.points)
+    mesh.cell_data['cell_id'] = np.arange(mesh.n_cells)
+    return triangle_surface(mesh)
+
+@pytest.mark.parametrize('bounds', BOXES)
+def test_matches_clip_box(surface, bounds):
+    clipped = clip_triangles(surface, bounds)
+    expected = surface.clip_box(bounds, invert=False).extract_surface()
+
+    assert clipped.area == pytest.approx(expected.area, rel=1e-5)
+    np.testing.assert_allclose(clipped.bounds, expected.bounds, atol=1e-6)
+
+    # Per source cell areas show the cell data is carried to the right pieces
+    n_cells = surface.n_cells
+    np.testing.assert_allclose(
+        np.bincount(clipped.cell_data['cell_id'], cell_areas(clipped), n_cells),
+        np.bincount(expected.cell_data['cell_id'], cell_areas(expected), n_cells),
+        atol=1e-7)
+
+@pytest.mark.parametrize('bounds', BOXES)
+def test_interpolates_point_data(surface, bounds):
+    clipped = clip_triangles(surface, bounds)
+    np.testing.assert_allclose(clipped.point_data['field'],
+                               linear_field(np.asarray(clipped.points)), atol=1e-5)
+    assert clipped.point_data.active_normals is not None
+
+def test_box_around_and_away_from_mesh(surface):
+    around = clip_triangles(surface, [-2, 2, -2, 2, -2, 2])
+    assert around.n_cells == surface.n_cells
+    assert around.area == pytest.approx(surface.area)
+
+    away = clip_triangles(surface, [5, 6, 5, 6, 5, 6])
+    assert away.n_cells == 0
+
+def test_volumes_have_no_triangle_surface():
+    assert triangle_surface(pv.UniformGrid(dims=(5, 5, 5))) is None